@@ -0,0 +1,197 @@
+###############################################
+#				BER Benchmarks				  #
+###############################################
+# References: 	bertvs.py, startup_bench.py	  #
+# Ingenion, LLC								  #
+###############################################
+
+# Times the BER hot paths against sim_xem and fixed register captures:
+#
+#	python3 ber_bench.py [--output results.json] [--baseline old.json] [--threshold 0.25]
+#
+# Results are written as JSON. With --baseline every result is compared to the same
+# result of an earlier run, the exit status is 1 if any got worse by more than threshold.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+
+import sim_xem
+from bertvs import FP_API
+from signal_map import signal_map, compiled_pin_map
+from ber_verdict import verdict_engine
+from log_manager import log_manager
+from tvs_fleet import TVS_Fleet
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLEET_SIZES = (1, 8, 64)
+# per call USB latency of the simulated fleet boards, without it the fleet
+# numbers only show GIL contention and not how boards poll in parallel
+FLEET_LATENCY = 0.002
+
+
+def capture(size, seed):
+	# A fixed raw BER block: connected bit, delay count and a few error counts
+	rng = np.random.default_rng(seed)
+	connected = (rng.random(size) > 0.05).astype(np.uint32) << 31
+	delay = rng.choice([4, 6, 1], size).astype(np.uint32) << 26
+	errors = np.where(rng.random(size) > 0.9, rng.integers(1, 5000, size), 0).astype(np.uint32)
+	return connected | delay | errors
+
+
+def timed(function, number, repeat=5):
+	# Median seconds per call over repeat batches of number calls
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		for _ in range(number):
+			function()
+		times.append((time.perf_counter() - start) / number)
+	return statistics.median(times)
+
+
+def quiet():
+	# FP_API prints every connect and disconnect
+	return contextlib.redirect_stdout(io.StringIO())
+
+
+class ber_bench():
+	def __init__(self, scale=1.0, latency=FLEET_LATENCY):
+		self.scale = scale
+		self.fleet_latency = latency
+		self.results = {}
+
+
+	def add(self, name, value, unit, better):
+		self.results[name] = {'value': value, 'unit': unit, 'better': better}
+		print(f'{name:<36}{value:14.2f} {unit}')
+
+
+	def latency(self, name, function, number):
+		self.add(name, timed(function, max(1, int(number * self.scale))) * 1e6, 'us', 'lower')
+
+
+	def device(self, fp):
+		self.latency('read_test_registers', fp.read_test_registers, 2000)
+		self.latency('failsafe_status (cached)', fp.failsafe_status, 20000)
+
+		# the uncached check is the 100 ms reset pulse plus this read and decode
+		self.latency('failsafe read and decode', fp.read_failsafe_registers, 2000)
+
+		raw = capture(len(fp.ber_test), 1)
+		self.latency('decode_test_registers', lambda: fp.decode_test_registers(raw), 20000)
+
+
+	def pin_map(self):
+		self.latency('pin map parse', lambda: compiled_pin_map.parse("BER_TVS_pm.txt"), 500)
+		self.latency('signal_map load', lambda: signal_map("BER_TVS_pm.txt"), 500)
+		pm = signal_map("BER_TVS_pm.txt")
+		self.latency('get_debug_info', lambda: [pm.get_debug_info(i) for i in range(len(pm.records))], 2000)
+
+
+	def verdict(self, fp):
+		engine = verdict_engine(signal_map("BER_TVS_pm.txt"))
+		tests = [fp.decode_test_registers(capture(len(fp.ber_test), seed)).copy() for seed in range(16)]
+
+		# the evaluation the GUI runs for every snapshot it draws
+		self.latency('verdict evaluate', lambda: [engine.evaluate(test) for test in tests], 500)
+
+		log = log_manager(os.path.join("TVS_Bench", "bench_log.txt"), export=False, database=None)
+		verdicts = [engine.evaluate(test) for test in tests]
+		self.latency('log_test render', lambda: [log.render_test(v) for v in verdicts], 100)
+
+
+	def fleet(self, sizes=FLEET_SIZES, seconds=2.0):
+		for size in sizes:
+			serials = [f"BENCH-{i:04d}" for i in range(size)]
+			for serial in serials:
+				sim_xem.attach(serial, latency=self.fleet_latency)
+			with quiet():
+				fleet = TVS_Fleet(sim_xem, serials)
+
+			# median of three windows, one slow window should not fail a run
+			rates = []
+			for _ in range(3):
+				rounds = 0
+				start = time.perf_counter()
+				while time.perf_counter() - start < seconds * self.scale / 3 or rounds == 0:
+					fleet.poll()
+					rounds += 1
+				rates.append(rounds * size / (time.perf_counter() - start))
+			self.add(f'fleet polls/s, {size} boards', statistics.median(rates), 'polls/s', 'higher')
+
+			with quiet():
+				fleet.close()
+			for serial in serials:
+				sim_xem.detach(serial)
+
+
+	def run(self, sizes=FLEET_SIZES):
+		with quiet():
+			fp = FP_API(sim_xem)
+		self.device(fp)
+		self.pin_map()
+		self.verdict(fp)
+		with quiet():
+			fp.close()
+
+		self.fleet(sizes)
+		return self.results
+
+
+def compare(results, baseline, threshold):
+	# Returns the results that got worse than baseline by more than threshold
+	regressions = []
+	for name, result in results.items():
+		old = baseline.get(name)
+		if old is None or old['value'] == 0:
+			continue
+		change = result['value'] / old['value'] - 1
+		worse = change if result['better'] == 'lower' else -change
+		if worse > threshold:
+			regressions.append((name, old['value'], result['value'], worse))
+	return regressions
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmarks the BER hot paths against sim_xem.")
+	parser.add_argument('--output', default="TVS_Bench/ber_bench.json", help="JSON file for the results")
+	parser.add_argument('--baseline', default='', help="earlier results to compare against")
+	parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown, 0.25 is 25%%")
+	parser.add_argument('--scale', type=float, default=1.0, help="scales the iteration counts, below 1 for a quick run")
+	parser.add_argument('--fleet', type=int, nargs='*', default=list(FLEET_SIZES), help="fleet sizes to poll")
+	parser.add_argument('--latency', type=float, default=FLEET_LATENCY, help="per call latency of the fleet boards in seconds")
+	args = parser.parse_args()
+
+	output = os.path.abspath(args.output)
+	baseline_file = os.path.abspath(args.baseline) if args.baseline else ''
+	# the pin map and bit file are found next to this script
+	os.chdir(HERE)
+	if not os.path.exists("TVS_Bench"):
+		os.mkdir("TVS_Bench")
+
+	results = ber_bench(args.scale, args.latency).run(args.fleet)
+
+	os.makedirs(os.path.dirname(output), exist_ok=True)
+	with open(output, 'w') as f:
+		json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+				   'machine': platform.machine(), 'scale': args.scale, 'fleet_latency': args.latency,
+				   'results': results}, f, indent=1)
+	print(f'\nResults written to {output}')
+
+	if baseline_file:
+		with open(baseline_file) as f:
+			baseline = json.load(f)['results']
+		regressions = compare(results, baseline, args.threshold)
+		for name, old, new, worse in regressions:
+			print(f'REGRESSION {name}: {old:.2f} -> {new:.2f} ({100*worse:.0f}% worse)')
+		if regressions:
+			sys.exit(1)
+		print(f'No regressions beyond {100*args.threshold:.0f}%')
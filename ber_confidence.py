@@ -0,0 +1,84 @@
+###############################################
+#			BER Confidence Accumulator		  #
+###############################################
+# References: 	bertvs.py					  #
+# Ingenion, LLC								  #
+###############################################
+
+from statistics import NormalDist
+import numpy as np
+
+
+class ber_confidence():
+	def __init__(self, divisor, window, target=1e-6, confidence=0.95):
+		# Adds up errors and observed bits per channel across polls. divisor is
+		# the bits per integration window and window its length in seconds, a
+		# channel is counted at most once per window so fast polls are not double counted.
+		self.divisor = np.asarray(divisor, dtype=float)
+		self.window = np.asarray(window, dtype=float)
+		self.target = target
+		self.confidence = confidence
+		self._z = NormalDist().inv_cdf(confidence)
+
+		n = len(self.divisor)
+		self.errors = np.zeros(n)
+		self.bits   = np.zeros(n)
+		self._last  = np.full(n, -np.inf)
+
+
+	def reset(self):
+		self.errors[:] = 0
+		self.bits[:] = 0
+		self._last[:] = -np.inf
+
+
+	def observe(self, raw, rows, now):
+		# raw is the full register block, rows the part of it that was just read
+		words = raw[rows]
+		fresh = ((words >> 31) == 1) & (now - self._last[rows] >= self.window[rows])
+
+		self.errors[rows] += np.where(fresh, words & 0x03ff_ffff, 0)
+		self.bits[rows]   += np.where(fresh, self.divisor[rows], 0)
+		self._last[rows]   = np.where(fresh, now, self._last[rows])
+
+
+	def bound(self, errors, bits):
+		# One sided upper confidence bound on BER for k errors in n bits (Poisson).
+		# No errors is exact, -ln(1-CL)/n, otherwise the chi-square quantile
+		# with 2(k+1) degrees of freedom comes from the Wilson-Hilferty approximation.
+		errors = np.asarray(errors, dtype=float)
+		bits = np.asarray(bits, dtype=float)
+
+		dof = 2 * (errors + 1)
+		chi2 = dof * (1 - 2/(9*dof) + self._z*np.sqrt(2/(9*dof)))**3
+		limit = np.where(errors == 0, -np.log(1 - self.confidence), chi2 / 2)
+
+		with np.errstate(divide='ignore'):
+			return np.where(bits > 0, limit / np.maximum(bits, 1), np.inf)
+
+
+	def upper_bound(self):
+		return self.bound(self.errors, self.bits)
+
+
+	def connector_bounds(self, rows, connector, connectors):
+		# Per connector bound, rows maps each pin map row to its test index and
+		# connector to its index in the connector list
+		errors = np.bincount(connector, weights=self.errors[rows], minlength=connectors)
+		bits   = np.bincount(connector, weights=self.bits[rows], minlength=connectors)
+		return self.bound(errors, bits)
+
+
+	def passed(self):
+		# Every channel is under target at the set confidence
+		return bool(len(self.bits)) and bool((self.upper_bound() < self.target).all())
+
+
+if __name__ == "__main__":
+	stats = ber_confidence([1_500_000], [0.01], target=1e-6, confidence=0.95)
+	raw = np.array([1 << 31], dtype=np.uint32)
+	polls = 0
+	while not stats.passed():
+		polls += 1
+		stats.observe(raw, slice(None), polls * 0.1)
+	print(f'{polls} error free polls for BER < 1e-6 at 95%, bound {stats.upper_bound()[0]:.2e}')
@@ -0,0 +1,82 @@
+###############################################
+#				BER Poll History			  #
+###############################################
+# References: 	bertvs.py					  #
+# Ingenion, LLC								  #
+###############################################
+
+import time
+import numpy as np
+
+
+class ber_history():
+	def __init__(self, capacity, width):
+		# Fixed size ring of raw BER register snapshots, the oldest is overwritten when full
+		self.capacity = capacity
+		self.width = width
+		self.raw  = np.zeros([capacity, width], dtype=np.uint32)
+		self.mono = np.zeros(capacity, dtype=float)		# time.monotonic() of each poll
+		self.wall = np.zeros(capacity, dtype=float)		# time.time() of each poll
+		self._head  = 0		# next slot to write
+		self.count = 0		# snapshots held
+		self.total = 0		# snapshots ever appended
+
+
+	def __len__(self):
+		return self.count
+
+
+	def append(self, raw, mono=None, wall=None):
+		i = self._head
+		self.raw[i] = raw
+		self.mono[i] = time.monotonic() if mono is None else mono
+		self.wall[i] = time.time() if wall is None else wall
+
+		self._head = (i + 1) % self.capacity
+		self.count = min(self.count + 1, self.capacity)
+		self.total += 1
+
+
+	def clear(self):
+		self._head = 0
+		self.count = 0
+
+
+	def segments(self, first=0, last=None):
+		# Returns the snapshots first..last (oldest is 0) as at most two
+		# (raw, mono, wall) views into the ring, nothing is copied
+		last = self.count if last is None else min(last, self.count)
+		if first >= last:
+			return []
+
+		start = (self._head - self.count) % self.capacity
+		a = start + first
+		b = start + last
+		if b <= self.capacity:
+			spans = [(a, b)]
+		elif a >= self.capacity:
+			spans = [(a - self.capacity, b - self.capacity)]
+		else:
+			spans = [(a, self.capacity), (0, b - self.capacity)]
+		return [(self.raw[i:j], self.mono[i:j], self.wall[i:j]) for i, j in spans]
+
+
+	def latest(self, n):
+		# The last n snapshots
+		return self.segments(max(self.count - n, 0))
+
+
+	def window(self, start, stop=None):
+		# Snapshots taken between two time.monotonic() values, as views
+		first = last = 0
+		for raw, mono, wall in self.segments():
+			first += int(np.searchsorted(mono, start, side='left'))
+			last  += len(mono) if stop is None else int(np.searchsorted(mono, stop, side='right'))
+		return self.segments(first, last)
+
+
+	def to_array(self):
+		# Copies the whole history out in time order
+		if self.count == 0:
+			return np.zeros([0, self.width], dtype=np.uint32)
+		return np.concatenate([raw for raw, mono, wall in self.segments()])
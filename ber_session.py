@@ -0,0 +1,134 @@
+###############################################
+#				BER Session File			  #
+###############################################
+# References: 	bertvs.py, ber_history.py	  #
+# Ingenion, LLC								  #
+###############################################
+
+# File layout, all little endian:
+#
+#	8 bytes		magic "BERTVS01"
+#	uint32		data offset (header size, a multiple of 64)
+#	uint32		length of the JSON header that follows
+#	JSON		device info, register offsets, pin map hash, record layout
+#	padding		zeros up to the data offset
+#	records		fixed size: float64 monotonic time, float64 wall time, uint32 raw[registers]
+#
+# The records can be memory mapped straight from the data offset.
+
+import hashlib
+import json
+import os
+import struct
+import time
+import numpy as np
+
+MAGIC = b"BERTVS01"
+ALIGN = 64
+
+
+def record_dtype(registers):
+	return np.dtype([('mono', '<f8'), ('wall', '<f8'), ('raw', '<u4', (registers,))])
+
+
+def file_hash(filePath):
+	with open(filePath, 'rb') as f:
+		return hashlib.sha256(f.read()).hexdigest()
+
+
+class session_writer():
+	def __init__(self, filePath, header, registers, flush_every=100):
+		# Creates the file and writes the header, records are appended with write()
+		self.file = filePath
+		self.registers = registers
+		self.flush_every = flush_every
+		self.count = 0
+
+		header = dict(header, registers=registers, created=time.time(),
+					  record=[['mono', '<f8'], ['wall', '<f8'], ['raw', '<u4', registers]])
+		text = json.dumps(header).encode()
+		offset = -(-(len(MAGIC) + 8 + len(text)) // ALIGN) * ALIGN
+
+		directory = os.path.dirname(filePath)
+		if directory and not os.path.exists(directory):
+			os.mkdir(directory)
+
+		self._f = open(filePath, 'wb')
+		self._f.write(MAGIC + struct.pack('<II', offset, len(text)) + text)
+		self._f.write(bytes(offset - len(MAGIC) - 8 - len(text)))
+
+		# one record reused for every write
+		self._record = np.zeros(1, dtype=record_dtype(registers))
+
+
+	def write(self, raw, mono=None, wall=None):
+		record = self._record
+		record['mono'] = time.monotonic() if mono is None else mono
+		record['wall'] = time.time() if wall is None else wall
+		record['raw'][0] = raw
+		self._f.write(record.data)
+
+		self.count += 1
+		if self.count % self.flush_every == 0:
+			self._f.flush()
+
+
+	def close(self):
+		if not self._f.closed:
+			self._f.flush()
+			os.fsync(self._f.fileno())
+			self._f.close()
+
+
+class session_reader():
+	def __init__(self, filePath):
+		# Parses the header and maps the records, a partly written last record is ignored
+		self.file = filePath
+		with open(filePath, 'rb') as f:
+			if f.read(len(MAGIC)) != MAGIC:
+				raise ValueError(f"{filePath} is not a BER session file")
+			offset, length = struct.unpack('<II', f.read(8))
+			self.header = json.loads(f.read(length))
+
+		self.registers = self.header['registers']
+		dtype = record_dtype(self.registers)
+		count = (os.path.getsize(filePath) - offset) // dtype.itemsize
+		if count > 0:
+			self.records = np.memmap(filePath, dtype=dtype, mode='r', offset=offset, shape=(count,))
+		else:
+			self.records = np.zeros(0, dtype=dtype)
+
+
+	def __len__(self):
+		return len(self.records)
+
+
+	@property
+	def raw(self):
+		return self.records['raw']
+
+	@property
+	def mono(self):
+		return self.records['mono']
+
+	@property
+	def wall(self):
+		return self.records['wall']
+
+
+	def between(self, start, stop, clock='wall'):
+		# Records taken between two times on the given clock, as a view
+		times = self.records[clock]
+		first = np.searchsorted(times, start, side='left')
+		last  = np.searchsorted(times, stop, side='right')
+		return self.records[first:last]
+
+
+if __name__ == "__main__":
+	import sys
+
+	session = session_reader(sys.argv[1])
+	print(json.dumps(session.header, indent=1))
+	print(f'{len(session)} records')
+	if len(session):
+		print(f'{session.wall[-1] - session.wall[0]:.1f} s captured')
@@ -0,0 +1,73 @@
+###############################################
+#			BER Test Verdict Engine			  #
+###############################################
+# References: 	bertvs_gui.py, log_manager.py #
+# Ingenion, LLC								  #
+###############################################
+
+import numpy as np
+
+# delay_to_type buckets, below 30 ns is LVDS, from 100 ns on it is TTL
+STANDARDS    = np.array(["LVDS", "RS422", "TTL"])
+DELAY_BOUNDS = np.array([30, 100])
+
+
+class ber_verdict():
+	# Evaluation of one ber_test snapshot, every per signal array is in pin map row order
+	def __init__(self, engine, test):
+		rows = engine.test_index
+
+		self.test      = test
+		self.ber       = test[rows, 0]
+		self.delay_ns  = test[rows, 1]
+		self.connected = test[rows, 2].astype(bool)
+
+		# a signal is found once it is connected with no bit errors
+		self.success  = (self.ber == 0) & self.connected
+		self.detected = STANDARDS[np.digitize(self.delay_ns, DELAY_BOUNDS)]
+		self.expected = engine.standard
+		self.passed   = self.success & (self.detected == self.expected)
+
+		# passed signals per connector, in get_connector_list order. The LEDs use the
+		# same rule as pass_fail, a connector at 100% has every signal passed.
+		self.completed  = np.bincount(engine.connector, weights=self.passed, minlength=len(engine.connectors)).astype(int)
+		self.totals     = engine.totals
+		self.completion = self.completed / self.totals
+
+		self.pass_fail = bool(self.passed.all())
+
+
+class verdict_engine():
+	def __init__(self, pm):
+		# Builds the index arrays once from a signal_map
+		self.connectors = pm.get_connector_list()
+
+		self.test_index = pm.compiled.test
+		self.standard   = np.array(pm.compiled.standard, dtype=str)
+		self.connector  = np.zeros(len(self.test_index), dtype=int)
+		for i, c in enumerate(self.connectors):
+			self.connector[pm.get_connector_rows(c)] = i
+		self.totals     = np.bincount(self.connector, minlength=len(self.connectors))
+
+
+	def evaluate(self, test):
+		return ber_verdict(self, test)
+
+
+	def connector_bounds(self, confidence):
+		# Upper BER bound per connector from a ber_confidence, in get_connector_list order
+		return confidence.connector_bounds(self.test_index, self.connector, len(self.connectors))
+
+
+if __name__ == "__main__":
+	from signal_map import shared_signal_map
+
+	engine = verdict_engine(shared_signal_map())
+	test = np.zeros([len(engine.test_index), 3])
+	test[:, 2] = 1
+	test[:, 1] = 40
+
+	result = engine.evaluate(test)
+	print(engine.connectors)
+	print(result.completed, result.totals)
+	print(f'Passed: {result.pass_fail}')
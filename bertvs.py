@@ -6,14 +6,64 @@
 # References: 	berv2.py					  #
 ###############################################
 
-import ok 
 import numpy as np
+from concurrent.futures import Future
+import functools
+import importlib
+import itertools
+import queue
 import time
+import os
+import threading
+
+from fpga_config import get_bitstream, configure
+from ber_history import ber_history
+from ber_session import session_writer, file_hash
+from ber_confidence import ber_confidence
+from fp_stats import fp_stats, instrumented_xem
+
+# The FrontPanel API module, loaded by frontpanel() the first time a real board is used
+ok = None
+
+
+def frontpanel():
+	global ok
+	if ok is None:
+		try:
+			ok = importlib.import_module('ok')
+		except ImportError:
+			raise ImportError("FrontPanel API (ok) is not available")
+	return ok
+
+
+# Device command priorities, a queued command runs before every queued command
+# with a higher number so a reset or disconnect never waits behind polls
+PRIORITY_CONTROL = 0	# connect, disconnect, resets
+PRIORITY_QUERY   = 1	# failsafe check, device info
+PRIORITY_POLL    = 2	# BER register reads
+
+
+def device_command(priority):
+	# Runs an FP_API method on the board's device owner thread and waits for it.
+	# A command called from another command is already on that thread and runs directly.
+	def decorate(method):
+		@functools.wraps(method)
+		def command(self, *args, **kwargs):
+			if threading.current_thread() is self._owner_thread:
+				return method(self, *args, **kwargs)
+			return self.submit(functools.partial(method, self), *args, priority=priority, **kwargs).result()
+		command.priority = priority
+		return command
+	return decorate
 
 
 class FP_API:
-	def __init__(self):
-		# Initialize the Frontpanel API
+	def __init__(self, backend=None, serial="", attempts=5, connect=True):
+		# Initialize the Frontpanel API, backend is the 'ok' module or a stand in like sim_xem
+		# and serial picks one board when several are attached ("" opens the first one).
+		# With connect=False nothing touches the hardware until connect_TVS is called.
+		self._ok = backend if backend is not None else frontpanel()
+
 		self._diff_a = 0
 		self._diff_b = 0
 		self._diff_c = 0
@@ -25,53 +75,150 @@ class FP_API:
 		self._single_offset = 0
 		self._address_space = 0
 		self.connected = 0
+		self._open_serial = serial
+		self._configured = False
 
 		self._productName   = None
 		self._deviceVersion = None
 		self._serialNumber  = None
 		self._deviceID      = None
 
-		self.xem = ok.okCFrontPanel()
-		self.devInfo = ok.okTDeviceInfo()
+		# every FrontPanel call is counted and timed, see fp_stats.py
+		self.stats = fp_stats()
+		self.xem = instrumented_xem(self._ok.okCFrontPanel(), self.stats)
+		self.devInfo = self._ok.okTDeviceInfo()
 		self.ber_test = np.empty([1, 3], dtype=float)
+		self._divisor   = np.ones(0)
+		self._period_ns = np.zeros(0)
+
+		# Register request vectors are built once per layout and refilled on every read
+		self._test_regs, self._test_entries = self._register_request(0x0008, 0)
+		self._failsafe_regs, self._failsafe_entries = self._register_request(0x0004, 4)
+		self._raw_test = np.zeros(0, dtype=np.uint32)
+		self._failsafe_words = np.zeros(4, dtype='<u4')
+		self._failsafe_violations = None
+		# counts reset_ber_test calls, so pollers can tell the counters started over
+		self.resets = 0
+		self._error_count = np.zeros(0, dtype=np.uint32)
+		self._delay_count = np.zeros(0, dtype=np.uint32)
+
+		# Optional record of every poll, see enable_history
+		self.history = None
+		self._history_capacity = 0
+		# Optional session file every poll is streamed to, see start_session
+		self.session = None
+		# Optional statistical early pass, see enable_early_pass
+		self.confidence = None
+		self.early_pass = threading.Event()
+		self._early_pass_callbacks = []
+
+		# Every USB transaction runs on one device owner thread, fed by a priority queue
+		self._commands = queue.PriorityQueue()
+		self._sequence = itertools.count()
+		self._owner_lock = threading.Lock()
+		self._owner_thread = None
 
 		#Try and detect a connected device
-		self.connect_TVS(5)				
-		self.device_reset() 
+		if connect:
+			self.connect_TVS(attempts)				
+			self.device_reset() 
+
+
+
+	def submit(self, function, *args, priority=PRIORITY_POLL, **kwargs):
+		# Queues function(*args, **kwargs) for the device owner thread and returns its Future.
+		# Commands run one at a time, lowest priority number first, in order within a priority.
+		future = Future()
+		with self._owner_lock:
+			if self._owner_thread is None:
+				self._owner_thread = threading.Thread(target=self._owner_loop, name=f'FP_API-{self._open_serial or "device"}', daemon=True)
+				self._owner_thread.start()
+			self._commands.put((priority, next(self._sequence), future, function, args, kwargs))
+		return future
+
+
+	def _owner_loop(self):
+		while True:
+			priority, sequence, future, function, args, kwargs = self._commands.get()
+			if function is None:
+				future.set_result(None)
+				return
+			if not future.set_running_or_notify_cancel():
+				continue
+			try:
+				future.set_result(function(*args, **kwargs))
+			except BaseException as e:
+				future.set_exception(e)
+
+
+	def close(self):
+		# Disconnects and stops the owner thread once the commands already queued are done
+		if self.connected:
+			self.disconnect_TVS()
+		with self._owner_lock:
+			if self._owner_thread is None:
+				return
+			done = Future()
+			self._commands.put((PRIORITY_POLL + 1, next(self._sequence), done, None, (), {}))
+			thread, self._owner_thread = self._owner_thread, None
+		done.result()
+		thread.join()
+
+
+	@device_command(PRIORITY_POLL)
+	def read_registers(self, regs):
+		# ReadRegisters on a caller's own request vector
+		return self.xem.ReadRegisters(regs)
+
 
+	@device_command(PRIORITY_POLL)
+	def poll_command(self, function, *args):
+		# Runs a caller's whole poll (read, copy into _raw_test, decode, statistics) as
+		# one command, so a reset or new layout can never land in the middle of it
+		return function(*args)
 
 
+	@device_command(PRIORITY_CONTROL)
 	def connect_TVS(self, attempts=1):
-		try:
-			self._connect_TVS()		
-			self.connected = 1
+		# Tries to connect attempts+1 times, one second apart
+		for attempt in range(attempts, -1, -1):
+			try:
+				self._connect_TVS()		
+				self.connected = 1
+				return
+
+			except ConnectionError as e:
+				if (attempt == 0): 
+					print(e)
+					print('Connection Timeout')
+					self.connected = 0
+					return
+				time.sleep(1)
 
-		except ConnectionError as e:
-			time.sleep(1)
-			if (attempts == 0): 
+			except Exception as e:
 				print(e)
-				print('Connection Timeout')
 				self.connected = 0
 				return
-			self.connect_TVS(attempts-1)
-
-		except Exception as e:
-			print(e)
-			self.connected = 0
 
 		
 	def _connect_TVS(self):
 		#Try and detect a connected device
-		opn = self.xem.OpenBySerial("")
+		opn = self.xem.OpenBySerial(self._open_serial)
 		if (opn == self.xem.NoError):
 			print("Device Found.")
 
 		elif (opn == self.xem.DeviceNotOpen):
 			raise ConnectionError("Device Not Found")
 		
-		config = self.xem.ConfigureFPGA("ber_tvs_fpga.bit")
+		# Loads the bit file from memory, skipped if the FPGA already runs this design
+		try:
+			bits = get_bitstream("ber_tvs_fpga.bit")
+		except OSError:
+			raise ConnectionError("File error occurred during open or read.")
+
+		config, self._configured = configure(self.xem, bits)
 		if (config == self.xem.NoError): 
-			print("Xem 7310 bit file loaded.")
+			print("Xem 7310 bit file loaded." if self._configured else "Xem 7310 already configured.")
 
 		elif (config == self.xem.DeviceNotOpen):
 			raise ConnectionError("Device is not open. Please disconnect other instances.")
@@ -110,9 +257,11 @@ class FP_API:
 		print(f'Serial Number: {self.serialNumber}\n')
 		
 
+	@device_command(PRIORITY_CONTROL)
 	def disconnect_TVS(self):
 		#disconnect the device
 		if self.connected:
+			self._failsafe_violations = None
 			self.xem.Close()
 			self.connected = 0
 			print("TVS disconnected")
@@ -121,6 +270,31 @@ class FP_API:
 		return
 	
 
+	@device_command(PRIORITY_CONTROL)
+	def device_added(self, serial):
+		# Hot plug handler, configures a newly arrived board if it is the one we want
+		if self.connected or self._open_serial not in ("", serial):
+			return False
+		self._open_serial, wanted = serial, self._open_serial
+		self.connect_TVS(0)
+		self._open_serial = wanted
+		self.device_reset()
+		return bool(self.connected)
+
+
+	@device_command(PRIORITY_CONTROL)
+	def device_removed(self, serial):
+		# Hot plug handler, drops the connection when our board goes away
+		if not self.connected or serial != self._serialNumber:
+			return False
+		self._failsafe_violations = None
+		self.connected = 0
+		self.xem.Close()
+		print("TVS removed")
+		return True
+
+
+	@device_command(PRIORITY_QUERY)
 	def get_version(self):
 		if self.connected:
 			return self.xem.ReadRegister(0x0000)
@@ -129,6 +303,7 @@ class FP_API:
 			return 0
 	
 
+	@device_command(PRIORITY_QUERY)
 	def get_device_info(self):
 		# Get device information
 		code = self.xem.GetDeviceInfo(self.devInfo)
@@ -156,8 +331,14 @@ class FP_API:
 		return f"{self._deviceID}"
 
 
+	@device_command(PRIORITY_CONTROL)
 	def reset_ber_test(self):
-		# Reset the logic
+		# Reset the logic, this also clears the failsafe result and the BER statistics
+		self._failsafe_violations = None
+		self.resets += 1
+		if self.confidence is not None:
+			self.confidence.reset()
+		self.early_pass.clear()
 		if self.connected:
 			self.xem.SetWireInValue(0,0,0xffff_ffff)
 			self.xem.UpdateWireIns()
@@ -167,15 +348,20 @@ class FP_API:
 		return
 
 
+	@device_command(PRIORITY_CONTROL)
 	def device_reset(self):
 		# Reset the device
 		if self.connected:
-			self.xem.ResetFPGA()
+			# a freshly downloaded design is already in its reset state
+			if not self._configured:
+				self.xem.ResetFPGA()
+			self._configured = False
 			self.reset_ber_test()
 			self.init_test_registers()
 		return
 	
 
+	@device_command(PRIORITY_CONTROL)
 	def init_test_registers(self):
 		rel_offsets = self.xem.ReadRegister(0x0001)
 
@@ -193,66 +379,184 @@ class FP_API:
 
 		self._address_space = self._diff_a + self._diff_b + self._diff_c + self._single
 		self.ber_test = np.empty([self._address_space, 3], dtype=float) 
+
+		# Theses are fixed values based on the TVS clock period
+		rows = np.arange(self._address_space)
+		self._divisor   = np.where(rows >= self._single_offset, 100_000,
+						  np.where(rows >= self._diff_c_offset, 7_500_000, 1_500_000)).astype(float)
+		self._period_ns = np.where(rows >= self._single_offset, 200, 6.666)
+
+		# Request vector and scratch space reused by every read_test_registers
+		self._test_regs, self._test_entries = self._register_request(self._ber_test_offset, self._address_space)
+		self._raw_test    = np.zeros(self._address_space, dtype=np.uint32)
+		self._error_count = np.zeros(self._address_space, dtype=np.uint32)
+		self._delay_count = np.zeros(self._address_space, dtype=np.uint32)
+
+		if self.confidence is not None:
+			self.enable_early_pass(self.confidence.target, self.confidence.confidence)
+
+		# the history holds one layout, a new one starts a new history
+		if self.history is not None and self.history.width != self._address_space:
+			self.history = ber_history(self._history_capacity, self._address_space)
+		# and so does a session file, its header and record size are fixed
+		if self.session is not None and self.session.registers != self._address_space:
+			print(f"Register layout changed, session {self.session.file} stopped")
+			self.stop_session()
 		return
 
 
-	def failsafe_status(self):
-		self.reset_ber_test()
-		# Check for device failures and create a list of failed pins
-		regs = ok.okTRegisterEntries(4)
+	def _register_request(self, address, count):
+		# Builds a ReadRegisters request for a contiguous address range, the
+		# entry proxies are kept so each read only has to collect the data
+		regs = self._ok.okTRegisterEntries(count)
+		entries = [regs[i] for i in range(count)]
+		for i, reg in enumerate(entries):
+			reg.address = address + i
+		return regs, entries
+
 
-		for i in range(4):
-			regs[i].address = 4 + i
+	@device_command(PRIORITY_QUERY)
+	def failsafe_status(self):
+		# Check for device failures and create a list of failed pins, the result
+		# is kept until the next reset so repeated checks cost one round trip
+		if self._failsafe_violations is None:
+			self.reset_ber_test()
+			self._failsafe_violations = self.read_failsafe_registers()
 
-		self.xem.ReadRegisters(regs)
+		return self._failsafe_violations.tolist()
 
-		check_signals = []
 
-		for i in range(4):
-			status_bits = bin(regs[i].data)[2:].zfill(32)
-			position = len(status_bits)*(i+1)
+	@device_command(PRIORITY_QUERY)
+	def read_failsafe_registers(self):
+		# Reads registers 4-7 and returns the signals without a failsafe, without the reset
+		self.xem.ReadRegisters(self._failsafe_regs)
+		self._failsafe_words[:] = [reg.data for reg in self._failsafe_entries]
 
-			for bit in status_bits:
-				if bit != '1':
-					check_signals.append(position-1)
-				position -= 1
-    
-		check_signals.sort()
-		return check_signals
+		# bit n of register 4+i is signal 32*i+n, a cleared bit is a violation
+		status_bits = np.unpackbits(self._failsafe_words.view(np.uint8), bitorder='little')
+		return np.flatnonzero(status_bits == 0)
 	
 
+	@device_command(PRIORITY_POLL)
 	def read_test_registers(self):
 		# reads the BER test registers
-		regs = ok.okTRegisterEntries(self._address_space)
-
-		for i in range(self._address_space):
-			regs[i].address = self._ber_test_offset + i
-			# print(regs[i].address)
-
-		self.xem.ReadRegisters(regs)
-
-		for i in range(self._address_space):
-
-			error_count = (regs[i].data >> 0)   & 0x03ff_ffff
-			delay_count = (regs[i].data >> 26)  & 0x001f
-
-			# Theses are fixed values based on the TVS clock period
-			if (i >= self._single_offset):
-				divisor = 100_000
-				period_ns = 200
-			elif (i >= self._diff_c_offset):
-				divisor = 7_500_000
-				period_ns = 6.666
-			else:
-				divisor = 1_500_000
-				period_ns = 6.666
-
-			ber = error_count/divisor
-			ns  = delay_count*period_ns
-
-			self.ber_test[i][0] = ber if ber < 1 else 1.0
-			self.ber_test[i][1] = ns
-			self.ber_test[i][2] = (regs[i].data >> 31)  & 0x0001
+		self.xem.ReadRegisters(self._test_regs)
+
+		self._raw_test[:] = [reg.data for reg in self._test_entries]
+		self.record_test_registers(slice(None))
+		self.decode_test_registers(self._raw_test)
+
+
+	def record_test_registers(self, rows, now=None):
+		# Everything a freshly read raw block feeds: the history, the session file
+		# and the BER statistics. rows is the part of _raw_test that was just read,
+		# now its time.monotonic().
+		if self.history is None and self.session is None and self.confidence is None:
+			return
+		mono = time.monotonic() if now is None else now
+		wall = time.time()
+		if self.history is not None:
+			self.history.append(self._raw_test, mono, wall)
+		if self.session is not None:
+			self.session.write(self._raw_test, mono, wall)
+		self.observe_test_registers(rows, mono)
+
+
+	def observe_test_registers(self, rows, now):
+		# Adds freshly read rows of the raw block to the BER statistics and
+		# fires the early pass once every channel is under target
+		if self.confidence is None:
+			return
+		self.confidence.observe(self._raw_test, rows, now)
+		if not self.early_pass.is_set() and self.confidence.passed():
+			self.early_pass.set()
+			print(f'Statistically passed at {100*self.confidence.confidence:g}% confidence')
+			for callback in self._early_pass_callbacks:
+				callback(self)
+
+
+	@device_command(PRIORITY_CONTROL)
+	def enable_early_pass(self, target=1e-6, confidence=0.95, callback=None):
+		# Accumulates errors and observed bits per channel and sets early_pass
+		# (and calls callback(self)) when the upper bound on every channel's BER
+		# is below target at the given confidence
+		window = self._divisor * self._period_ns * 1e-9
+		self.confidence = ber_confidence(self._divisor, window, target, confidence)
+		self.early_pass.clear()
+		if callback is not None:
+			self._early_pass_callbacks.append(callback)
+		return self.confidence
+
+
+	@device_command(PRIORITY_CONTROL)
+	def disable_early_pass(self):
+		self.confidence = None
+		self._early_pass_callbacks = []
+		self.early_pass.clear()
+
+
+	@device_command(PRIORITY_CONTROL)
+	def enable_history(self, capacity=36_000):
+		# Keeps the last capacity raw polls with their timestamps (an hour at 10 Hz)
+		self._history_capacity = capacity
+		self.history = ber_history(capacity, self._address_space)
+		return self.history
+
+
+	@device_command(PRIORITY_CONTROL)
+	def disable_history(self):
+		self.history = None
+
+
+	@device_command(PRIORITY_QUERY)
+	def start_session(self, filePath, pin_map="BER_TVS_pm.txt"):
+		# Streams every following poll to a session file (see ber_session.py)
+		self.stop_session()
+		self.get_device_info()
+		header = {
+			'product':  self.productName,
+			'firmware': self.deviceVersion,
+			'serial':   self.serialNumber,
+			'device_id': self.deviceID,
+			'version':  self.get_version(),
+			'offsets': {
+				'ber_test': self._ber_test_offset,
+				'diff_a': self._diff_a_offset,
+				'diff_b': self._diff_b_offset,
+				'diff_c': self._diff_c_offset,
+				'single': self._single_offset,
+				'address_space': self._address_space,
+			},
+			'pin_map': os.path.basename(pin_map),
+			'pin_map_sha256': file_hash(pin_map),
+		}
+		self.session = session_writer(filePath, header, self._address_space)
+		return self.session
+
+
+	@device_command(PRIORITY_CONTROL)
+	def stop_session(self):
+		# the FrontPanel call statistics are kept next to the session file
+		if self.session is not None:
+			self.session.close()
+			self.stats.dump(f"{os.path.splitext(self.session.file)[0]}_stats.json")
+			self.session = None
+
+
+	def decode_test_registers(self, raw):
+		# decodes a block of raw BER words into ber_test, one row per register
+		error_count = np.bitwise_and(raw, 0x03ff_ffff, out=self._error_count)
+		delay_count = np.right_shift(raw, 26, out=self._delay_count)
+		np.bitwise_and(delay_count, 0x001f, out=delay_count)
+
+		ber = self.ber_test[:,0]
+		np.divide(error_count, self._divisor, out=ber)
+		np.minimum(ber, 1.0, out=ber)
+		np.multiply(delay_count, self._period_ns, out=self.ber_test[:,1])
+		# delay scratch is free again, reuse it for the connected bit
+		np.right_shift(raw, 31, out=self._delay_count)
+		self.ber_test[:,2] = self._delay_count
+		return self.ber_test
 
 
 	def print_offsets(self):
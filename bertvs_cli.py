@@ -0,0 +1,123 @@
+###############################################
+#			TVS Headless Test Runner		  #
+###############################################
+# References: 	bertvs_gui.py				  #
+# Ingenion, LLC								  #
+###############################################
+
+# Runs the same test flow as the GUI without a display:
+#
+#	python3 bertvs_cli.py --serial 1234 --inspector "A. Smith" --notes "line 3"
+#
+# Exit status: 0 passed, 1 failed, 2 no TVS found, 3 failsafe violations
+
+import argparse
+import datetime
+import sys
+import time
+import numpy as np
+
+from bertvs import FP_API
+from signal_map import shared_signal_map
+from ber_verdict import verdict_engine
+from poll_scheduler import poll_scheduler
+from log_manager import log_manager
+
+EXIT_PASSED   = 0
+EXIT_FAILED   = 1
+EXIT_NO_TVS   = 2
+EXIT_FAILSAFE = 3
+
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Runs the BER TVS test without the GUI.")
+	parser.add_argument('--serial', default='xxxx', help="TVS serial number, used in the log name")
+	parser.add_argument('--inspector', default='', help="inspector/conductor name")
+	parser.add_argument('--notes', default='', help="additional notes for the log")
+	parser.add_argument('--device', default='', help="XEM serial to open when several are attached")
+	parser.add_argument('--timeout', type=float, default=60.0, help="longest a test runs before the verdict is taken")
+	parser.add_argument('--target', type=float, default=1e-6, help="BER every channel must be proven under")
+	parser.add_argument('--confidence', type=float, default=0.95, help="confidence for the early pass")
+	parser.add_argument('--attempts', type=int, default=5, help="connection retries")
+	parser.add_argument('--log', default="TVS_Logs/TVS_Current_Log.txt", help="temporary log file")
+	parser.add_argument('--simulate', action='store_true', help="run against the simulated XEM7310")
+	parser.add_argument('--stats', default='', help="write the FrontPanel call statistics to this JSON file")
+	return parser.parse_args(argv)
+
+
+def run(args):
+	backend = None
+	if args.simulate:
+		import sim_xem
+		backend = sim_xem
+
+	device = FP_API(backend, serial=args.device, attempts=args.attempts)
+	if not device.connected:
+		print("No TVS found.")
+		return EXIT_NO_TVS
+
+	pm = shared_signal_map()
+	engine = verdict_engine(pm)
+	log = log_manager(args.log)
+
+	# Failsafe check first, like the GUI does on start up
+	violations = device.failsafe_status()
+	if len(violations) != 0:
+		print(f"Failsafe errors at signals: {violations}")
+		log.log_failsafe_violations(pm.get_failsafe_info(violations))
+		finish(device, log, args, None, False)
+		return EXIT_FAILSAFE
+	print("Passed Failsafe Check")
+
+	# BER test, ends early once every signal passed with its BER proven under
+	# target, otherwise the verdict at the timeout decides
+	device.reset_ber_test()
+	device.enable_early_pass(args.target, args.confidence)
+	scheduler = poll_scheduler(device)
+	verdict = engine.evaluate(np.zeros_like(device.ber_test))
+	lost = False
+	deadline = time.monotonic() + args.timeout
+
+	while time.monotonic() < deadline:
+		if not device.connected:
+			print("Device was disconnected during test")
+			lost = True
+			break
+		if scheduler.poll():
+			verdict = engine.evaluate(device.ber_test)
+		if verdict.pass_fail and device.early_pass.is_set():
+			break
+		time.sleep(min(scheduler.wait_time(), max(deadline - time.monotonic(), 0)))
+	else:
+		# like an operator pressing Stop, the last verdict decides
+		print("Test time limit reached")
+
+	# the BER each connector is proven under, from the errors and bits of all its signals
+	for connector, bound in zip(engine.connectors, engine.connector_bounds(device.confidence).tolist()):
+		print(f'{connector:<4} BER < {bound:.1e} at {100*args.confidence:g}% confidence')
+
+	passed = verdict.pass_fail and not lost
+	finish(device, log, args, verdict, passed)
+	print("Test Passed" if passed else "Test Failed")
+	return EXIT_PASSED if passed else EXIT_FAILED
+
+
+def finish(device, log, args, verdict, passed):
+	# Writes the log the same way Stop and Save Log do in the GUI
+	now = datetime.datetime.now()
+	dev_info = [device.productName,  device.deviceVersion,
+				device.serialNumber, device.deviceID]
+
+	log.log_info(dev_info, args.inspector, args.serial)
+	if len(args.notes) > 0: log.log_note(args.notes + "\n")
+	if verdict is not None: log.log_test(verdict)
+	log.pass_fail = "pass" if passed else "fail"
+	log.log_end(now.strftime('%m/%d/%Y\n%I:%M:%S'))
+	log.enter_log(args.serial, now.strftime('%m%d%y_%H%M'))
+	device.disconnect_TVS()
+	if args.stats:
+		device.stats.dump(args.stats)
+
+
+if __name__ == "__main__":
+	sys.exit(run(parse_args()))
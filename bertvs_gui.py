@@ -9,34 +9,46 @@
 from tkinter import *
 from tkinter import ttk
 from tkinter import messagebox
-import pandas as pd
 import numpy as np
 import datetime
 import threading 
+import queue
 import time 
-import glob
-import os
 
 from richtext import *
+from canvas_render import *
 from signal_map import *
+from ber_verdict import *
 from bertvs import *
+from poll_scheduler import *
+from tvs_monitor import *
 from log_manager import *
 from multiplatform_opener import *
 
+# The device is polled at most every POLL_PERIOD seconds, the progress window redraws every FRAME_MS
+POLL_PERIOD = 0.1
+FRAME_MS    = 50
+
+# A test stops on its own once every channel's BER is below EARLY_PASS_BER at this confidence
+EARLY_PASS_BER        = 1e-6
+EARLY_PASS_CONFIDENCE = 0.95
+
 
 class GUI():
-	def __init__(self):
+	def __init__(self, backend=None):
 		# Initial Window
-		self.device = FP_API()
+		# the window comes up first, the TVS is connected in the background
+		self.device = FP_API(backend, connect=False)
 		self.window = Tk()
 		self.window.geometry('450x350')
 		self.window.title('TVS Test')
 
-		self.pm = signal_map("BER_TVS_pm.txt")
+		self.pm = shared_signal_map("BER_TVS_pm.txt")
 		self.connectors = self.pm.get_connector_list()
 		self.signals = self.pm.get_signals_per_connector()
+		self.engine = verdict_engine(self.pm)
+		self.verdict = None
 		self.pass_fail  = False
-		self.test_state = np.zeros(len(self.device.ber_test)).astype(bool).tolist()
 
 		self.multientry = False
 		self.hasStart = 0
@@ -113,17 +125,15 @@ class GUI():
 			btn.grid(row=row, column=column, pady=2, padx=25 if column == 3 else 0)
 			self.button.append(btn)
 
-		if (self.device.connected == True):
-			self.button[1].configure(text='Disconnect', command=self.clicked_disconnect)
-
 		#---------------Device Call---------------
-		#Find information on connected device
 		self.window.configure(background = 'light sky blue')
-		self.show_device_info()
 		# Set up the second window
 		self.test_window()
-		# Precheck failsafe pins
-		self.failsafe_check()
+		# Watch for the TVS being plugged in or removed and connect it, once it
+		# is connected check_hotplug shows the device info and prechecks the failsafe pins
+		self.monitor = TVS_Monitor(self.device)
+		self.monitor.connect()
+		self.window.after(100, self.check_hotplug)
 
 	
 	'''
@@ -182,6 +192,13 @@ class GUI():
 			text_y = (y1 + y2) / 2  # vertically centered with the circle
 			# create the text object
 			self.ratio.append(self.canvas.create_text(text_x, text_y, text='0%'))
+
+		# LEDs driven by each connector, J13 shows the J12 loopback
+		self.connector_leds = [[i] for i in range(12)]
+		self.connector_leds[11].append(12)
+
+		# only items that change are pushed to the canvas
+		self.render = canvas_render(self.canvas)
 		
 		self.canvas.grid(row=2,column=0)
 		return self.window2
@@ -275,41 +292,90 @@ class GUI():
 			now = datetime.datetime.now()
 			self.testTime.configure(text=now.strftime('%m/%d/%Y\n%I:%M:%S'))
 			for led in self.leds:
-				self.canvas.itemconfigure(led,fill='red')
+				self.render.set(led,fill='red')
 
 			# Starts the test
 			self.hasStart = 1
-
-			# Creates new thread to run scanner
-			self.testing = threading.Thread(target=self.callback)
+			self.verdict = None
+			self.device.enable_early_pass(EARLY_PASS_BER, EARLY_PASS_CONFIDENCE)
+
+			# Creates new thread to run scanner, it only talks to the device and
+			# hands decoded snapshots to the Tk thread through a small queue
+			self.stop_event = threading.Event()
+			self.snapshots = queue.Queue(maxsize=2)
+			self.testing = threading.Thread(target=self.acquire, args=(self.stop_event, self.snapshots))
 			self.testing.daemon = True
 			self.testing.start()
+			self.window.after(FRAME_MS, self.render_progress)
 
 		time.sleep(0.5)
 		self.multientry = False
 		
 		
-	# Callback to loop TVS scanning 
-	def callback(self):	
+	# Acquisition loop, runs on the test thread and never touches Tk
+	def acquire(self, stop_event, snapshots):	
 		try:
-			while(self.hasStart==1):
+			# each register group is read only as often as its counters can change
+			scheduler = poll_scheduler(self.device, min_interval=POLL_PERIOD)
+			while not stop_event.is_set():
 				# Check in the TVS is still connected
-				# Updates window to keep GUI Thread from freezing
-				self.window.update()
-				self.window2.update()
-				# Calls scanner and checks progress
-				self.read_progress()
-				time.sleep(0.1)
+				if (self.device.connected == False):
+					raise Exception('Device was disconnected during test')
+				# Calls scanner and passes on a copy of the result when something changed
+				if scheduler.poll():
+					self.post_snapshot(snapshots, self.device.ber_test.copy())
+				stop_event.wait(scheduler.wait_time())
 
 		except Exception as e:
 			print('Error Running Test')
 			print(e)
+			self.post_snapshot(snapshots, e)
+
+		else:
+			print("Test Stopped")
+
+
+	def post_snapshot(self, snapshots, item):
+		# Only the newest snapshot matters, the oldest is dropped when the queue is full
+		while True:
+			try:
+				snapshots.put_nowait(item)
+				return
+			except queue.Full:
+				try:
+					snapshots.get_nowait()
+				except queue.Empty:
+					pass
+
+
+	# Render loop, runs on the Tk thread at a fixed frame rate
+	def render_progress(self):
+		latest = None
+		while True:
+			try:
+				latest = self.snapshots.get_nowait()
+			except queue.Empty:
+				break
+
+		if isinstance(latest, Exception):
 			messagebox.showwarning(title='Test', message='Error Running Test')
 			self.button[0].configure(text='Start Test', command=self.clicked_start, relief='flat', bg='white')
 			self.hasStart=0
+			return
 
-		else:
-			print("Test Stopped")
+		if latest is not None:
+			self.read_progress(latest)
+
+		# ends the test once the BER is statistically proven and every signal passed
+		if self.hasStart == 1 and self.device.early_pass.is_set() and self.pass_fail:
+			self.clicked_stop()
+			self.testStatus.configure(text=f'Passed at {100*EARLY_PASS_CONFIDENCE:g}%\nconfidence:',background='light sky blue')
+			return
+
+		# the thread may post its last snapshot or its error after the queue was
+		# drained and then exit, whatever it left is picked up on the next frame
+		if self.testing.is_alive() or not self.snapshots.empty():
+			self.window.after(FRAME_MS, self.render_progress)
 
 
 	'''
@@ -327,7 +393,10 @@ class GUI():
 		now = datetime.datetime.now()
 		self.testTime.configure(text=now.strftime('%m/%d/%Y\n%I:%M:%S'))
 		self.hasStart = 0
-		# self.testing.join()
+		# the test thread sees the stop within one poll period, then the last snapshot is drawn
+		self.stop_event.set()
+		self.testing.join(1)
+		self.render_progress()
 
 		# gets the user entries
 		self.entryU    = self.enterU.get()
@@ -340,7 +409,10 @@ class GUI():
 		
 		self.log.log_info(dev_info, self.entryU, self.entryS)
 		if (len(self.enterNote) > 1): self.log.log_note(self.enterNote)
-		self.log.log_test(self.device.ber_test, self.test_state, self.pass_fail)
+		# a test stopped before the first poll has not seen any signal
+		if self.verdict is None:
+			self.verdict = self.engine.evaluate(np.zeros_like(self.device.ber_test))
+		self.log.log_test(self.verdict)
 		self.log.log_end(self.testTime.cget('text'))
 
 		if self.pass_fail == 1: self.result.configure(text='Test Passed', state='normal')
@@ -355,15 +427,31 @@ class GUI():
 	################################################################################
 	'''
 	def clicked_connect(self):
-		# attempts to connect the TVS
-		self.device.connect_TVS(10)				
+		# attempts to connect the TVS in the background, check_hotplug picks up the result
+		self.button[1].configure(text='Connecting...', command=lambda: None)
+		self.monitor.connect()
 
-		if self.device.connected == True:
-			self.device.device_reset()
-			self.show_device_info()
-			self.button[1].configure(text='Disconnect', command=self.clicked_disconnect)
-		else:
-			messagebox.showinfo('Error','No device found. Please connect the FPGA.')
+
+	'''
+	################################################################################
+	#                               check_hotplug                                  #
+	#          applies connect and disconnect events from the TVS monitor          #
+	################################################################################
+	'''
+	def check_hotplug(self):
+		for event, serial in self.monitor.get_events():
+			if event == 'connected':
+				self.show_device_info()
+				self.button[1].configure(text='Disconnect', command=self.clicked_disconnect)
+				self.failsafe_check()
+			elif event == 'disconnected':
+				self.show_device_info()
+				self.button[1].configure(text='Connect', command=self.clicked_connect)
+			else:
+				self.button[1].configure(text='Connect', command=self.clicked_connect)
+				messagebox.showinfo('Error','No device found. Please connect the FPGA.')
+
+		self.window.after(100, self.check_hotplug)
 
 	'''
 	################################################################################
@@ -386,15 +474,9 @@ class GUI():
 	################################################################################
 	'''
 	def clicked_file(self): 
-		# gets the log directory
-		directory = self.log.get_log_directory()
-
-		# finds and opens the file last edited
-		if len(os.listdir(directory)) > 0:
-			list_of_files = glob.glob(directory+'/*') # * means all if need specific format then *.csv
-
-			latest_file = max(list_of_files, key=os.path.getmtime)
-
+		# finds and opens the file last edited, saved runs are looked up in the run database
+		latest_file = self.log.latest_log()
+		if latest_file is not None:
 			subprocess_opener(latest_file)
 
 
@@ -443,9 +525,9 @@ class GUI():
 
 	def resetLEDs(self):
 		for led in self.leds:
-			self.canvas.itemconfigure(led,fill='')
+			self.render.set(led,fill='')
 		for ratio in self.ratio:
-			self.canvas.itemconfigure(ratio,text='0%')
+			self.render.set(ratio,text='0%')
 
 
 	'''
@@ -523,12 +605,8 @@ class GUI():
 			print("No failsafe errors")
 			return
 		
-		info = []
-
-		# Loop through the list of signals with no failsafe
-		for signal in low_failsafes:
-			# Get information about the signal failure
-			info.append(self.pm.get_debug_info(signal))
+		# Get the driver and receiver of every signal without a failsafe
+		info = self.pm.get_failsafe_info(low_failsafes)
 
 		self.log.log_failsafe_violations(info)
 		self.show_fsPopup()
@@ -541,49 +619,35 @@ class GUI():
 	#    checks the progress of the BER test and updates the leds on window 2      #
 	################################################################################
 	'''
-	def read_progress(self):
-		# checks if the device is still connected
-		if (self.device.connected == False):
-			raise Exception('Device was disconnected during test')
+	def read_progress(self, test):
+		# test is the latest ber_test snapshot from the acquisition thread,
+		# the verdict holds the found signals per connector
+		self.verdict = self.engine.evaluate(test)
 
-		# calls the most recent register bridge state
-		self.device.read_test_registers()
-		
-		# alias for the signal test registers
-		test  = self.device.ber_test
-
-		# gets the connection bit from the test registers and creates a mask
-		test_state = test[:,0] == 0 & test[:,2].astype(bool)
-		mask = test_state.tolist()
-
-		# This gets all the successfully found signals and divides them by connector 'J--'
-		success = self.pm.signals_per_connector(self.pm.map.iloc[mask])
-
-		def set_led(ratio, n):
+		def led_color(ratio):
 			if (ratio == 1):
-				self.canvas.itemconfigure(self.leds[n],fill='green')
+				return 'green'
 			elif (ratio > 0.5):
-				self.canvas.itemconfigure(self.leds[n],fill='yellow')
+				return 'yellow'
 			elif (ratio > 0):
-				self.canvas.itemconfigure(self.leds[n],fill='orange')
-			else:
-				self.canvas.itemconfigure(self.leds[n],fill='red')
+				return 'orange'
+			return 'red'
 
 
+		self.render.begin_frame()
 		for i in range(len(self.signals)):
 			# set the LED color based on the number of successful connections for the current connector
-			completion = success[i] / self.signals[i]
-			self.canvas.itemconfigure(self.ratio[i],text=f'{100*completion:.0f}%')
-			set_led(completion,i)
-			if i == 11:
-				self.canvas.itemconfigure(self.ratio[12],text=f'{100*completion:.0f}%')
-				set_led(completion,12)
+			completion = self.verdict.completion[i]
+			for n in self.connector_leds[i]:
+				self.render.set(self.ratio[n],text=f'{100*completion:.0f}%')
+				self.render.set(self.leds[n],fill=led_color(completion))
+		self.render.end_frame()
 
-		# updates the list of successful connections
-		self.pass_fail  = np.sum(success) == np.sum(self.signals)
-		self.test_state = test_state
+		# updates the overall result
+		self.pass_fail  = self.verdict.pass_fail
 
 
 
-app = GUI()
-app.window.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+	app = GUI()
+	app.window.mainloop()
@@ -0,0 +1,70 @@
+###############################################
+#			Progress Canvas Renderer		  #
+###############################################
+# References: 	bertvs_gui.py				  #
+# Ingenion, LLC								  #
+###############################################
+
+
+class canvas_render():
+	def __init__(self, canvas):
+		# Remembers what every canvas item was last set to and only
+		# pushes the options that actually changed
+		self.canvas = canvas
+		self._state = {}
+
+		# canvas operations issued in total, by the current frame and by the last finished frame
+		self.ops = 0
+		self.frames = 0
+		self.frame_ops = 0
+		self.last_frame_ops = 0
+
+
+	def set(self, item, **options):
+		last = self._state.setdefault(item, {})
+		changed = {key: value for key, value in options.items() if last.get(key) != value}
+		if not changed:
+			return False
+
+		self.canvas.itemconfigure(item, **changed)
+		last.update(changed)
+		self.ops += 1
+		self.frame_ops += 1
+		return True
+
+
+	def begin_frame(self):
+		self.frame_ops = 0
+
+
+	def end_frame(self):
+		# Returns the number of canvas operations the frame issued
+		self.frames += 1
+		self.last_frame_ops = self.frame_ops
+		return self.frame_ops
+
+
+	def forget(self):
+		# The canvas was rebuilt, nothing on it is known anymore
+		self._state.clear()
+
+
+	def stats(self):
+		return {'frames': self.frames, 'ops': self.ops, 'last_frame_ops': self.last_frame_ops,
+				'ops_per_frame': self.ops / self.frames if self.frames else 0.0}
+
+
+if __name__ == "__main__":
+	class _counting_canvas():
+		def __init__(self):
+			self.calls = 0
+		def itemconfigure(self, item, **options):
+			self.calls += 1
+
+	render = canvas_render(_counting_canvas())
+	for frame in range(100):
+		render.begin_frame()
+		for item in range(26):
+			render.set(item, fill='green' if frame > 50 else 'red')
+		render.end_frame()
+	print(render.stats())
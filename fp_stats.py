@@ -0,0 +1,164 @@
+###############################################
+#			FrontPanel Call Statistics		  #
+###############################################
+# References: 	bertvs.py, ok.py			  #
+# Ingenion, LLC								  #
+###############################################
+
+# Counts every FrontPanel call FP_API makes, with the registers and bytes it moved
+# and its latency in a power of two histogram (bucket k holds calls that took
+# under 2**k ns). Recording a call is a clock read, a bit_length and a few
+# integer adds, so it stays on in production. FP_API only calls the board from
+# its device owner thread, so the counters need no lock.
+
+import json
+import time
+
+BUCKETS = 40	# 2**39 ns is about 9 minutes
+
+# Registers and bytes moved per call, from its arguments
+def _register_list(regs):	return len(regs), 8 * len(regs)		# address and data per register
+def _one_register(*args):	return 1, 8
+def _wire_in(*args):		return 1, 0							# buffered until UpdateWireIns
+def _wire_update(*args):	return 0, 32 * 4					# the whole wire in block
+def _bitstream(data, *args):return 0, len(data)
+def _nothing(*args):		return 0, 0
+
+CALLS = {
+	'ReadRegisters':			_register_list,
+	'ReadRegister':				_one_register,
+	'WriteRegister':			_one_register,
+	'SetWireInValue':			_wire_in,
+	'UpdateWireIns':			_wire_update,
+	'ConfigureFPGA':			_nothing,
+	'ConfigureFPGAFromMemory':	_bitstream,
+	'ResetFPGA':				_nothing,
+	'GetDeviceInfo':			_nothing,
+}
+
+
+class call_stats():
+	__slots__ = ('count', 'registers', 'bytes', 'total_ns', 'max_ns', 'histogram')
+
+	def __init__(self):
+		self.histogram = [0] * BUCKETS
+		self.reset()
+
+
+	def reset(self):
+		# zeroed in place, the instrumented_xem wrappers keep this object
+		self.count = 0
+		self.registers = 0
+		self.bytes = 0
+		self.total_ns = 0
+		self.max_ns = 0
+		self.histogram[:] = [0] * BUCKETS
+
+
+	def percentile(self, q):
+		# Upper bound in ns of the bucket holding the q-th percentile call
+		if self.count == 0:
+			return 0
+		rank = q / 100 * self.count
+		seen = 0
+		for k, n in enumerate(self.histogram):
+			seen += n
+			if seen >= rank:
+				return min(1 << k, self.max_ns)
+		return self.max_ns
+
+
+	def to_dict(self):
+		return {
+			'count': self.count,
+			'registers': self.registers,
+			'bytes': self.bytes,
+			'total_ms': self.total_ns / 1e6,
+			'mean_us': self.total_ns / self.count / 1e3 if self.count else 0.0,
+			'p50_us': self.percentile(50) / 1e3,
+			'p99_us': self.percentile(99) / 1e3,
+			'max_us': self.max_ns / 1e3,
+			'histogram_ns': {1 << k: n for k, n in enumerate(self.histogram) if n},
+		}
+
+
+class fp_stats():
+	def __init__(self):
+		self.calls = {name: call_stats() for name in CALLS}
+		self.started = time.time()
+
+
+	def reset(self):
+		for stats in self.calls.values():
+			stats.reset()
+		self.started = time.time()
+
+
+	def snapshot(self):
+		# Counters of every call made at least once, as plain dicts
+		return {name: stats.to_dict() for name, stats in self.calls.items() if stats.count}
+
+
+	def report(self):
+		lines = [f"{'call':<24}{'count':>9}{'registers':>11}{'bytes':>12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}"]
+		for name, s in self.snapshot().items():
+			lines.append(f"{name:<24}{s['count']:>9}{s['registers']:>11}{s['bytes']:>12}"
+						 f"{s['mean_us']:>10.1f}{s['p50_us']:>10.1f}{s['p99_us']:>10.1f}{s['max_us']:>10.1f}")
+		return "\n".join(lines)
+
+
+	def dump(self, filePath):
+		with open(filePath, 'w') as f:
+			json.dump({'started': self.started, 'ended': time.time(), 'calls': self.snapshot()}, f, indent=1)
+
+
+class instrumented_xem():
+	# Stands in for an okCFrontPanel, the calls in CALLS are timed and
+	# everything else is handed straight to the wrapped device
+	def __init__(self, xem, stats=None):
+		self._xem = xem
+		self.stats = stats if stats is not None else fp_stats()
+		for name, size in CALLS.items():
+			if hasattr(xem, name):
+				setattr(self, name, self._timed(getattr(xem, name), self.stats.calls[name], size))
+
+
+	@staticmethod
+	def _timed(call, stats, size):
+		clock = time.perf_counter_ns
+		def timed(*args):
+			start = clock()
+			try:
+				return call(*args)
+			finally:
+				elapsed = clock() - start
+				registers, moved = size(*args)
+				stats.count += 1
+				stats.registers += registers
+				stats.bytes += moved
+				stats.total_ns += elapsed
+				if elapsed > stats.max_ns:
+					stats.max_ns = elapsed
+				stats.histogram[min(elapsed.bit_length(), BUCKETS - 1)] += 1
+		return timed
+
+
+	def __getattr__(self, name):
+		# only reached for calls that are not timed, cached so the next lookup is direct
+		value = getattr(self._xem, name)
+		if callable(value):
+			setattr(self, name, value)
+		return value
+
+
+if __name__ == "__main__":
+	import sim_xem
+	from bertvs import FP_API
+
+	fp = FP_API(sim_xem)
+	fp.failsafe_status()
+	for _ in range(2000):
+		fp.read_test_registers()
+
+	print(fp.stats.report())
+	fp.disconnect_TVS()
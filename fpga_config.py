@@ -0,0 +1,84 @@
+###############################################
+#			FPGA Configuration Cache		  #
+###############################################
+# References: 	bertvs.py					  #
+# Ingenion, LLC								  #
+###############################################
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+_lock = threading.Lock()
+_bitstreams = {}
+
+
+class bitstream():
+	def __init__(self, filePath="ber_tvs_fpga.bit", cacheDir="TVS_Cache"):
+		# Maps the bit file once and keeps its content hash
+		self.file = filePath
+		self.stamp = self.file_stamp(filePath)
+		with open(filePath, 'rb') as f:
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		self.hash = hashlib.sha256(self.data).hexdigest()
+
+		# Design version (register 0x0000) seen after loading each bitstream
+		self.version_file = os.path.join(cacheDir, "bitstream_versions.json")
+		self.versions = {}
+		try:
+			with open(self.version_file) as f:
+				self.versions = json.load(f)
+		except (OSError, ValueError):
+			pass
+
+
+	@staticmethod
+	def file_stamp(filePath):
+		info = os.stat(filePath)
+		return (info.st_size, info.st_mtime_ns)
+
+
+	def known_version(self):
+		return self.versions.get(self.hash)
+
+
+	def record_version(self, version):
+		if self.versions.get(self.hash) == version:
+			return
+		self.versions[self.hash] = version
+		try:
+			directory = os.path.dirname(self.version_file)
+			if directory and not os.path.exists(directory):
+				os.mkdir(directory)
+			with open(self.version_file, 'w') as f:
+				json.dump(self.versions, f, indent=1)
+		except OSError:
+			# the cache only saves time, a read-only disk just means a download next run
+			pass
+
+
+def get_bitstream(filePath="ber_tvs_fpga.bit"):
+	# Returns the process wide bitstream for a file, reloaded only if the file changed
+	key = os.path.abspath(filePath)
+	with _lock:
+		cached = _bitstreams.get(key)
+		if cached is None or cached.stamp != bitstream.file_stamp(filePath):
+			cached = bitstream(filePath)
+			_bitstreams[key] = cached
+	return cached
+
+
+def configure(xem, bits):
+	# Loads bits onto the FPGA unless it already runs the same design.
+	# Returns the FrontPanel error code and whether a download happened.
+	version = bits.known_version()
+	if version is not None and xem.IsFrontPanelEnabled():
+		if xem.ReadRegister(0x0000) == version:
+			return xem.NoError, False
+
+	code = xem.ConfigureFPGAFromMemory(bits.data)
+	if code == xem.NoError:
+		bits.record_version(xem.ReadRegister(0x0000))
+	return code, True
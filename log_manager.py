@@ -6,22 +6,56 @@
 # Ingenion, LLC								  #
 ###############################################
 
-import pandas as pd
-import numpy as np
+import csv
+import datetime
+import json
 import os
+import sqlite3
 
 from signal_map import *
+from run_database import run_database
+
+TEST_HEADER = ("**If all tests are completed they should say passed. \n"
+			   "\n"
+			   "  If errors do occur during a loopback test, or a test case was\n"
+			   "  found unsuccessful for any reason, a debug string will be\n"
+			   "  presented with the format shown below:\n"
+			   "\n"
+			   "  Driver| driver pins   Receiver| receiver pins   |Loopback pins   driver[polarity] -> receiver[polarity]\n\n")
+PASSED = "\t Passed".ljust(15)
+FAIL   = "\t Fail".ljust(15)
+
+# Machine readable results, one run record and one record per signal for every saved log.
+# Fields are only ever added at the end, RESULTS_SCHEMA changes if one is renamed or removed.
+RESULTS_SCHEMA = 1
+RUN_FIELDS = ['schema', 'run_id', 'log_file', 'ended', 'serial', 'inspector', 'notes',
+			  'product', 'firmware', 'device_serial', 'device_id',
+			  'verdict', 'signals', 'passed_signals', 'failsafe_violations']
+SIGNAL_FIELDS = ['schema', 'run_id', 'row', 'test', 'connector', 'loopback', 'signal_pair',
+				 'standard', 'detected', 'connected', 'passed', 'ber', 'delay_ns',
+				 'driver', 'driver_pins', 'receiver', 'receiver_pins', 'loop_pins']
 
 class log_manager():
-	def __init__(self, filePath="TVS_Logs/TVS_Current_Log.txt"):
+	def __init__(self, filePath="TVS_Logs/TVS_Current_Log.txt", export=True, database="TVS_Logs/TVS_Runs.db"):
 		# Stores the Report in a Temporary file
 		self.log_file = filePath
 		self.pass_fail = "fail"
-
-		self.pm = signal_map()
-		self.p_map = self.pm.map
+		# one handle per session, opened by the first section written
+		self._file = None
+
+		# what the current log holds, for the results export
+		self.export = export
+		self._run = {}
+		self._verdict = None
+		# saved runs are indexed here, database=None turns it off
+		self.database_file = database
+		self._database = None
+
+		self.pm = shared_signal_map()
 		self.connectors = self.pm.get_connector_list()
 		self.signals = self.pm.get_signals_per_connector()
+		# only the verdict columns change between runs
+		self._report = self.report_lines()
 
 		# replaces the temporary file
 		if os.path.exists(filePath):
@@ -34,62 +68,72 @@ class log_manager():
 			os.mkdir(directory)
 
 
+	def _write(self, lines, overwrite=False):
+		# Writes one rendered section through the session's file handle. The handle
+		# stays open until enter_log, overwrite starts the file over.
+		if overwrite or self._file is None:
+			if self._file is not None:
+				self._file.close()
+			self._file = open(self.log_file, 'w' if overwrite else 'a', buffering=1 << 16)
+		self._file.write("".join(lines))
+		# flush point, the section is handed to the OS but not synced
+		self._file.flush()
+
+
+	def close(self):
+		# Syncs the log to disk and lets go of the file
+		if self._file is None:
+			return
+		self._file.flush()
+		os.fsync(self._file.fileno())
+		self._file.close()
+		self._file = None
+
+
 	# Logs Developer Information into File
 	def log_info(self, deviceInfo, entryU, entryS):
+		self._run.update(serial=entryS, inspector=entryU, product=deviceInfo[0],
+						 firmware=deviceInfo[1], device_serial=deviceInfo[2], device_id=deviceInfo[3])
+		lines = []
 
-		action = 'a' if os.path.exists(self.log_file) else 'w'
-		TVSfile = open(self.log_file,action)
-		
 		# Title
 		title = "-+-+-TVS Information-+-+-"
-		TVSfile.write(f"\n\n{title.center(62,' ')}\n")
-		TVSfile.write("\n")
-		TVSfile.write(f"Inspector/Conductor: {entryU} \n")
-		TVSfile.write(f"  TVS Serial Number: {entryS} \n")
-		TVSfile.write("\n")
+		lines.append(f"\n\n{title.center(62,' ')}\n")
+		lines.append("\n")
+		lines.append(f"Inspector/Conductor: {entryU} \n")
+		lines.append(f"  TVS Serial Number: {entryS} \n")
+		lines.append("\n")
 		
 		# Device and Test Information
-		TVSfile.write(f"--------------------------------------------------------------\n")
-		TVSfile.write(f"         Product: {deviceInfo[0]}\n")
-		TVSfile.write(f"Firmware version: {deviceInfo[1]}\n")
-		TVSfile.write(f"   Serial Number: {deviceInfo[2]}\n")
-		TVSfile.write(f"       Device ID: {deviceInfo[3]}\n")
-		TVSfile.write(f"--------------------------------------------------------------\n")
-		TVSfile.close()
+		lines.append(f"--------------------------------------------------------------\n")
+		lines.append(f"         Product: {deviceInfo[0]}\n")
+		lines.append(f"Firmware version: {deviceInfo[1]}\n")
+		lines.append(f"   Serial Number: {deviceInfo[2]}\n")
+		lines.append(f"       Device ID: {deviceInfo[3]}\n")
+		lines.append(f"--------------------------------------------------------------\n")
+		self._write(lines)
 
 
 	def log_note(self,tvsNotes):
-		# Check if the log file exists and open it in append mode if it does, otherwise open it in write mode
-		action = 'a' if os.path.exists(self.log_file) else 'w'
-		TVSfile = open(self.log_file, action)
-
+		self._run['notes'] = tvsNotes.strip()
 		# Write a header and the notes to the file
-		TVSfile.write("Additional Notes".center(40, "=") +"\n")
+		lines = ["Additional Notes".center(40, "=") +"\n"]
 		tvsNotes = "\n   ".join(tvsNotes[i:i+34] for i in range(0, len(tvsNotes), 34)).replace("\t", " ")
-		TVSfile.write("   "+ tvsNotes)
-		TVSfile.write("".center(40, "=") +"\n")
-		TVSfile.close()
-
+		lines.append("   "+ tvsNotes)
+		lines.append("".center(40, "=") +"\n")
+		self._write(lines)
 
-	def log_test(self, status=np.array(0), test_state=list, pass_fail=0):
-		# Check if the log file exists and open it in append mode if it does, otherwise open it in write mode
-		action = 'a' if os.path.exists(self.log_file) else 'w'
-		TVSfile = open(self.log_file, action)
 
-		TVSfile.write("**If all tests are completed they should say passed. \n")
-		TVSfile.write("\n")
-		TVSfile.write("  If errors do occur during a loopback test, or a test case was\n")
-		TVSfile.write("  found unsuccessful for any reason, a debug string will be\n")
-		TVSfile.write("  presented with the format shown below:\n")
-		TVSfile.write("\n")
-		TVSfile.write("  Driver| driver pins   Receiver| receiver pins   |Loopback pins   driver[polarity] -> receiver[polarity]\n\n")
+	def report_lines(self):
+		# Builds the pin map part of every report line once, per connector a
+		# header and (row, signal pair, expected standard, debug string) per signal
+		debug_format = lambda y,x: "".join(s.ljust(y) for s in x)
 
+		report = []
 		for connector in self.connectors:
-			connector_signals = self.p_map[self.p_map['Connector'] == connector]
-			TVSfile.write("\n"+ connector.center(40,"-") +"\n")
-
-			for signal in connector_signals.itertuples():
-				# Each signal in the connector signal dataframe contains this information:
+			signals = []
+			for row in self.pm.get_connector_rows(connector):
+				# Each signal in the pin map contains this information:
 				# 0 	Index=0,
 				# 1 	Test=0, 
 				# 2 	Connector='J1', 
@@ -97,9 +141,7 @@ class log_manager():
 				# 4 	Signal_Pair='RS422[0,2]', 
 				# 5 	Standard='RS422', 
 				# 6 	Info=['U600', '9,10,11', 'U601', '3,2,1', '9p->17p', '10n->4n']
-				io_type = self.delay_to_type(status[signal[1],1])
-
-				debug_format = lambda y,x: "".join(s.ljust(y) for s in x)
+				signal = self.pm.records[row]
 
 				driver   = signal[6][0]
 				receiver = signal[6][2]
@@ -108,71 +150,179 @@ class log_manager():
 				loopbacks = debug_format(10,signal[6][4:])
 
 				debug_string = f"debug info: \t{driver}| {driver_pins}  {receiver}| {receiver_pins}  |{loopbacks}" 
-
-				if status[signal[1],2] == 0:
-					TVSfile.write(f"   {signal[4]}" + "\t Fail".ljust(15)   + "No test"
-				   				+ f"\t\t{debug_string}\n")
-
-				elif (io_type == signal[5]) and (test_state[signal[0]] == True):
-					TVSfile.write(f"   {signal[4]}" + "\t Passed".ljust(15) 
-				   			    + f"{io_type}\t{status[signal[1],0]:.4f}\n")
-					
+				signals.append((int(row), f"   {signal[4]}", signal[5], f"\t\t{debug_string}\n"))
+
+			report.append(("\n"+ connector.center(40,"-") +"\n", signals))
+		return report
+
+
+	def render_test(self, result):
+		# Fills the verdict and BER of one ber_verdict into the prepared report lines
+		detected  = result.detected.tolist()
+		connected = result.connected.tolist()
+		passed    = result.passed.tolist()
+		ber       = result.ber.tolist()
+
+		lines = [TEST_HEADER]
+		for header, signals in self._report:
+			lines.append(header)
+			for row, pair, standard, debug_string in signals:
+				if not connected[row]:
+					lines.append(f"{pair}{FAIL}No test{debug_string}")
+				elif passed[row]:
+					lines.append(f"{pair}{PASSED}{detected[row]}\t{ber[row]:.4f}\n")
 				else:
-					TVSfile.write(f"   {signal[4]}" + "\t Fail".ljust(15)   
-								+ f"expected {signal[5]}, got {io_type}\t{status[signal[1],0]:.4f}"
-								+ f"\t\t{debug_string}\n")
+					lines.append(f"{pair}{FAIL}expected {standard}, got {detected[row]}\t{ber[row]:.4f}{debug_string}")
+		return "".join(lines)
 
-		TVSfile.close()
 
-		# If the number of successful pins equals the total number of pins tested, set pass_fail to "pass"
-		if pass_fail == 1:
+	def log_test(self, result):
+		# result is the ber_verdict of the last poll, the same one the GUI shows
+		self._write([self.render_test(result)])
+		self._verdict = result
+
+		# If every signal passed, set pass_fail to "pass"
+		if result.pass_fail:
 			self.pass_fail = "pass"
 
 
 	def log_end(self,time):
-		# Check if the log file exists and open it in append mode if it does, otherwise open it in write mode
-		action = 'a' if os.path.exists(self.log_file) else 'w'
-		TVSfile = open(self.log_file, action)
-
 		# Write the end time to the file
-		TVSfile.write("\nTest Ended at: %s \n" %time.replace("\n", " "))
-		TVSfile.write("||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||\n")
-		TVSfile.close()
+		lines = ["\nTest Ended at: %s \n" %time.replace("\n", " ")]
+		lines.append("||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||\n")
+		self._write(lines)
     
 
 	def log_failsafe_violations(self, low_failsafes):
-		# Open log file in 'w' mode to overwrite any existing content
-		TVSfile = open(self.log_file, 'w')
-		TVSfile.write("\nTVS Failsafe Failures Detected: \n\n")
+		# the log starts over with the violations
+		self._run = {'failsafe_violations': len(low_failsafes)}
+		self._verdict = None
+		lines = ["\nTVS Failsafe Failures Detected: \n\n"]
 		# Write header for table with column names
-		TVSfile.write(f"{'Driver':<12} {'Receiver':<12} \n")
+		lines.append(f"{'Driver':<12} {'Receiver':<12} \n")
 		# Loop through each pin in the DataFrame and write its information to the log
 		for signal in low_failsafes:
 			# Write information for the current pin to the log in a formatted string
-			TVSfile.write(f"{signal[0]:<12} {signal[1]:<12} \n")
+			lines.append(f"{signal[0]:<12} {signal[1]:<12} \n")
 
-		TVSfile.write('\n')
-		TVSfile.write("||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||\n")
-		TVSfile.close()
+		lines.append('\n')
+		lines.append("||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||\n")
+		# overwrites any existing content
+		self._write(lines, overwrite=True)
 
 
 	def log_reset(self):
 		# Reset the pass_fail status
 		self.pass_fail = "fail"
-		# Open log file in 'w' mode to overwrite any existing content
-		TVSfile = open(self.log_file, 'w')
-		# Write DEVICE RESET message to log with centered formatting
-		TVSfile.write("\n\n" + "DEVICE RESET".center(62," ") + "\n\n")
-		TVSfile.write("||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||\n")
-		TVSfile.close()
+		self._run = {}
+		self._verdict = None
+		# Write DEVICE RESET message to log with centered formatting, overwriting any existing content
+		lines = ["\n\n" + "DEVICE RESET".center(62," ") + "\n\n"]
+		lines.append("||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||\n")
+		self._write(lines, overwrite=True)
 
 
 	def enter_log(self, serial, time):
+		# The log is complete, it is synced once here before it gets its final name
+		self.close()
 		# Construct the new name for the log file using the device serial number, test end time, and pass/fail status
-		newName = "TVS_Logs/TVS_" + serial + "_" + time + "_" + self.pass_fail + ".txt"
+		newName = "TVS_Logs/TVS_" + serial + "_" + time + "_" + self.verdict() + ".txt"
 		# Rename the current log file with the new name
 		os.rename(self.log_file, newName)
 
+		if self.export or self.database_file is not None:
+			run, signals = self.results(newName)
+			# the text log is saved either way
+			if self.export:
+				try:
+					self.export_results(run, signals, os.path.dirname(newName))
+				except OSError as e:
+					print(f"Results export failed: {e}")
+			if self.database_file is not None:
+				try:
+					self.database().record(run, signals)
+				except sqlite3.Error as e:
+					print(f"Run database failed: {e}")
+
+		# the next log starts without this run's notes, info and verdict
+		self.pass_fail = "fail"
+		self._run = {}
+		self._verdict = None
+
+
+	def verdict(self):
+		# "pass" or "fail" of the current log, the last logged verdict decides.
+		# pass_fail can only turn a pass into a fail, the CLI does for a lost board.
+		if self._verdict is not None and not self._verdict.pass_fail:
+			return "fail"
+		return self.pass_fail
+
+
+	def database(self):
+		# The run database, opened on first use
+		if self._database is None:
+			self._database = run_database(self.database_file)
+		return self._database
+
+
+	def latest_log(self):
+		# Returns the most recently written log file or None. The unsaved log is always
+		# newer than every saved one, saving moves it away.
+		if os.path.exists(self.log_file):
+			return self.log_file
+		if self.database_file is not None:
+			latest = self.database().latest()
+			if latest is not None and os.path.exists(latest['log_file']):
+				return latest['log_file']
+
+		# logs saved before the database existed
+		import glob
+		logs = glob.glob(os.path.join(self.get_log_directory(), 'TVS_*.txt'))
+		return max(logs, key=os.path.getmtime) if logs else None
+
+
+	def results(self, logFile):
+		# Returns the run record and the signal records of the log saved as logFile
+		run_id = os.path.splitext(os.path.basename(logFile))[0]
+		run = dict.fromkeys(RUN_FIELDS, "")
+		run.update(failsafe_violations=0, signals=0, passed_signals=0)
+		run.update(self._run)
+		run.update(schema=RESULTS_SCHEMA, run_id=run_id, log_file=logFile, verdict=self.verdict(),
+				   ended=datetime.datetime.now().isoformat(timespec='seconds'))
+
+		signals = []
+		result = self._verdict
+		if result is not None:
+			c = self.pm.compiled
+			run.update(signals=len(result.passed), passed_signals=int(result.passed.sum()))
+			detected, connected, passed = result.detected.tolist(), result.connected.tolist(), result.passed.tolist()
+			ber, delay = result.ber.tolist(), result.delay_ns.tolist()
+			for row in range(len(c)):
+				signals.append({'schema': RESULTS_SCHEMA, 'run_id': run_id, 'row': row, 'test': int(c.test[row]),
+								'connector': c.connector[row], 'loopback': c.loopback[row], 'signal_pair': c.signal_pair[row],
+								'standard': c.standard[row], 'detected': detected[row], 'connected': connected[row],
+								'passed': passed[row], 'ber': ber[row], 'delay_ns': delay[row],
+								'driver': c.driver[row], 'driver_pins': c.driver_pins[row], 'receiver': c.receiver[row],
+								'receiver_pins': c.receiver_pins[row], 'loop_pins': " ".join(c.loop_pins[row])})
+		return run, signals
+
+
+	def export_results(self, run, signals, directory="TVS_Logs"):
+		# Appends the records to TVS_Results.jsonl, TVS_Runs.csv and TVS_Signals.csv
+		with open(os.path.join(directory, "TVS_Results.jsonl"), 'a') as f:
+			lines = [json.dumps({'record': 'run', **run})]
+			lines += [json.dumps({'record': 'signal', **signal}) for signal in signals]
+			f.write("\n".join(lines) + "\n")
+
+		for name, fields, records in (("TVS_Runs.csv", RUN_FIELDS, [run]), ("TVS_Signals.csv", SIGNAL_FIELDS, signals)):
+			path = os.path.join(directory, name)
+			new = not os.path.exists(path)
+			with open(path, 'a', newline='') as f:
+				writer = csv.DictWriter(f, fieldnames=fields)
+				if new:
+					writer.writeheader()
+				writer.writerows(records)
+
 
 	def delay_to_type(self, delay):
 		io_type = "none"
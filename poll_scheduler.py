@@ -0,0 +1,176 @@
+###############################################
+#			Adaptive BER Poll Scheduler		  #
+###############################################
+# References: 	bertvs.py					  #
+# Ingenion, LLC								  #
+###############################################
+
+import time
+import numpy as np
+
+
+class poll_group():
+	def __init__(self, device, name, first, count, min_interval, max_interval):
+		# One register sub-range that shares an integration window
+		self.name  = name
+		self.first = first
+		self.count = count
+		self.rows  = slice(first, first + count)
+
+		# the counters cannot change faster than the hardware integrates
+		self.window = float(device._divisor[first] * device._period_ns[first]) * 1e-9
+		self.base_interval = max(self.window, min_interval)
+		self.max_interval  = max(max_interval, self.base_interval)
+		self.interval = self.base_interval
+		self.next_due = 0.0
+		self.reads = 0
+
+
+class poll_scheduler():
+	def __init__(self, device, min_interval=0.1, max_interval=1.0, backoff=2.0, settle=3):
+		# Reads each group of BER registers only when it is due. A group that stays
+		# unchanged for settle reads backs off toward max_interval, any change
+		# brings it straight back to its base interval.
+		self.device = device
+		self.backoff = backoff
+		self.settle = settle
+
+		layout = [
+			('diff_a', device._diff_a_offset, device._diff_a),
+			('diff_b', device._diff_b_offset, device._diff_b),
+			('diff_c', device._diff_c_offset, device._diff_c),
+			('single', device._single_offset, device._single),
+		]
+		self.groups = [poll_group(device, name, first, count, min_interval, max_interval)
+					   for name, first, count in layout if count > 0]
+		self._unchanged = {group.name: 0 for group in self.groups}
+		# a reset of the BER logic puts every group back to its base interval
+		self._resets = device.resets
+
+		# The groups are contiguous, the due ones are read as one span with a
+		# single ReadRegisters. Request vectors are built per span on first use.
+		self._requests = {}
+		self.transactions = 0
+
+
+	def wait_time(self, now=None):
+		# Seconds until the next group is due
+		now = time.monotonic() if now is None else now
+		if not self.groups:
+			return self.backoff
+		if self.device.resets != self._resets:
+			return 0.0
+		return max(min(group.next_due for group in self.groups) - now, 0.0)
+
+
+	def _request(self, first, last):
+		# Request vector covering groups first..last
+		key = (first, last)
+		if key not in self._requests:
+			start = self.groups[first].first
+			count = self.groups[last].first + self.groups[last].count - start
+			regs, entries = self.device._register_request(self.device._ber_test_offset + start, count)
+			self._requests[key] = (start, count, regs, entries)
+		return self._requests[key]
+
+
+	def _converged(self, device):
+		# Per group, whether its channels may back off: always without an early pass,
+		# otherwise once every channel of the group is proven under target
+		if device.confidence is None or device.early_pass.is_set():
+			return [True] * len(self.groups)
+		under = device.confidence.upper_bound() < device.confidence.target
+		return [bool(under[group.rows].all()) for group in self.groups]
+
+
+	def poll(self, now=None):
+		# Reads the groups that are due, decodes into device.ber_test and
+		# returns the names of the groups whose registers changed. The poll runs
+		# on the device owner thread, it shares _raw_test and the BER statistics
+		# with resets.
+		now = time.monotonic() if now is None else now
+		return self.device.poll_command(self._poll, now)
+
+
+	def _poll(self, now):
+		if self.device.resets != self._resets:
+			self._resets = self.device.resets
+			self.tighten()
+
+		due = [i for i, group in enumerate(self.groups) if group.next_due <= now]
+		if not due:
+			return []
+
+		# one transaction from the first to the last due group, a group in between
+		# that was not due yet is read along with them
+		device = self.device
+		first, last = due[0], due[-1]
+		start, count, regs, entries = self._request(first, last)
+		device.read_registers(regs)
+		self.transactions += 1
+
+		raw = device._raw_test
+		fresh = np.fromiter((reg.data for reg in entries), dtype=np.uint32, count=count)
+		converged = self._converged(device)
+		changed = []
+
+		for i in range(first, last + 1):
+			group = self.groups[i]
+			group.reads += 1
+
+			block = raw[group.rows]
+			words = fresh[group.first - start:group.first - start + group.count]
+			if group.reads == 1 or not np.array_equal(block, words):
+				block[:] = words
+				changed.append(group.name)
+				self._unchanged[group.name] = 0
+				group.interval = group.base_interval
+			else:
+				self._unchanged[group.name] += 1
+				# a group still gathering bits for the early pass has not converged
+				if self._unchanged[group.name] >= self.settle and converged[i]:
+					group.interval = min(group.interval * self.backoff, group.max_interval)
+
+			group.next_due = now + group.interval
+
+		# one history entry, session record and statistics update for everything read
+		if first == 0 and last == len(self.groups) - 1:
+			device.record_test_registers(slice(None), now)
+		else:
+			device.record_test_registers(slice(start, start + count), now)
+
+		if changed:
+			device.decode_test_registers(raw)
+		return changed
+
+
+	def tighten(self):
+		# Puts every group back to its base interval and makes it due now
+		for group in self.groups:
+			group.interval = group.base_interval
+			group.next_due = 0.0
+			self._unchanged[group.name] = 0
+
+
+	def intervals(self):
+		return {group.name: group.interval for group in self.groups}
+
+
+	def reads(self):
+		return {group.name: group.reads for group in self.groups}
+
+
+if __name__ == "__main__":
+	import sim_xem
+	from bertvs import FP_API
+
+	fp = FP_API(backend=sim_xem)
+	scheduler = poll_scheduler(fp)
+
+	end = time.monotonic() + 5
+	while time.monotonic() < end:
+		scheduler.poll()
+		time.sleep(scheduler.wait_time())
+
+	print(f'Reads per group in 5 s: {scheduler.reads()}, {scheduler.transactions} transactions')
+	print(f'Intervals: {scheduler.intervals()}')
@@ -0,0 +1,118 @@
+###############################################
+#				TVS Run Database			  #
+###############################################
+# References: 	log_manager.py				  #
+# Ingenion, LLC								  #
+###############################################
+
+# Every saved log as rows in a local SQLite file, so questions like "latest log"
+# or "all failures of serial X" are index lookups instead of directory scans.
+# The records are the ones log_manager.results() builds for the results export.
+
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+	run_id TEXT PRIMARY KEY, schema INTEGER, log_file TEXT, ended TEXT, serial TEXT, inspector TEXT,
+	notes TEXT, product TEXT, firmware TEXT, device_serial TEXT, device_id TEXT, verdict TEXT,
+	signals INTEGER, passed_signals INTEGER, failsafe_violations INTEGER
+);
+CREATE TABLE IF NOT EXISTS signals (
+	schema INTEGER, run_id TEXT, row INTEGER, test INTEGER, connector TEXT, loopback TEXT,
+	signal_pair TEXT, standard TEXT, detected TEXT, connected INTEGER, passed INTEGER, ber REAL,
+	delay_ns REAL, driver TEXT, driver_pins TEXT, receiver TEXT, receiver_pins TEXT, loop_pins TEXT,
+	PRIMARY KEY (run_id, row)
+);
+CREATE INDEX IF NOT EXISTS runs_serial    ON runs (serial, ended);
+CREATE INDEX IF NOT EXISTS runs_ended     ON runs (ended);
+CREATE INDEX IF NOT EXISTS runs_verdict   ON runs (verdict, ended);
+CREATE INDEX IF NOT EXISTS signals_connector ON signals (connector, passed);
+CREATE INDEX IF NOT EXISTS signals_driver    ON signals (driver, passed);
+CREATE INDEX IF NOT EXISTS signals_receiver  ON signals (receiver, passed);
+"""
+
+
+class run_database():
+	def __init__(self, filePath="TVS_Logs/TVS_Runs.db"):
+		self.file = filePath
+		directory = os.path.dirname(filePath)
+		if directory and not os.path.exists(directory):
+			os.mkdir(directory)
+
+		self.db = sqlite3.connect(filePath)
+		self.db.row_factory = sqlite3.Row
+		self.db.executescript(SCHEMA)
+
+
+	def record(self, run, signals):
+		# Stores one saved log, a run saved again under the same name replaces the old rows.
+		# The columns are the RUN_FIELDS and SIGNAL_FIELDS of log_manager.
+		with self.db:
+			self.db.execute(f"INSERT OR REPLACE INTO runs ({','.join(run)}) VALUES ({','.join('?' * len(run))})",
+							list(run.values()))
+			self.db.execute("DELETE FROM signals WHERE run_id = ?", (run['run_id'],))
+			if signals:
+				fields = list(signals[0])
+				self.db.executemany(f"INSERT INTO signals ({','.join(fields)}) VALUES ({','.join('?' * len(fields))})",
+									[[signal[field] for field in fields] for signal in signals])
+
+
+	def latest(self):
+		# Returns the most recently saved run or None, runs are stored in the order they were saved
+		return self.db.execute("SELECT * FROM runs ORDER BY rowid DESC LIMIT 1").fetchone()
+
+
+	def runs(self, serial=None, verdict=None, since=None, until=None, limit=None):
+		# Returns saved runs, newest first. since and until are ISO date strings.
+		where, values = [], []
+		for column, test, value in (('serial', '=', serial), ('verdict', '=', verdict),
+									('ended', '>=', since), ('ended', '<', until)):
+			if value is not None:
+				where.append(f"{column} {test} ?")
+				values.append(value)
+
+		query = "SELECT * FROM runs"
+		if where:
+			query += " WHERE " + " AND ".join(where)
+		query += " ORDER BY ended DESC"
+		if limit is not None:
+			query += f" LIMIT {int(limit)}"
+		return self.db.execute(query, values).fetchall()
+
+
+	def failures(self, serial=None, **filters):
+		return self.runs(serial=serial, verdict="fail", **filters)
+
+
+	def signals(self, run_id=None, connector=None, chip=None, passed=None):
+		# Returns per signal results, chip matches the driver or the receiver
+		where, values = [], []
+		for column, value in (('run_id', run_id), ('connector', connector), ('passed', passed)):
+			if value is not None:
+				where.append(f"{column} = ?")
+				values.append(value)
+
+		query = "SELECT * FROM signals"
+		if chip is not None:
+			# one indexed lookup per chip column instead of an OR over both
+			condition = " AND ".join(where + ["{} = ?"])
+			query = (f"SELECT * FROM signals WHERE {condition.format('driver')} UNION "
+					 f"SELECT * FROM signals WHERE {condition.format('receiver')}")
+			values = values + [chip] + values + [chip]
+		elif where:
+			query += " WHERE " + " AND ".join(where)
+		return self.db.execute(query + " ORDER BY run_id, row", values).fetchall()
+
+
+	def close(self):
+		self.db.close()
+
+
+if __name__ == "__main__":
+	database = run_database()
+	latest = database.latest()
+	print(dict(latest) if latest is not None else "No runs recorded")
+	print(f"{len(database.failures())} failed runs")
+	for signal in database.signals(chip="U600", passed=0)[:10]:
+		print(signal['run_id'], signal['signal_pair'], signal['detected'], signal['ber'])
@@ -6,47 +6,157 @@
 # Ingenion, LLC								  #
 ###############################################
 
-import pandas as pd
+from collections import namedtuple
+import os
+import threading
+import numpy as np
+
+# One pin map row, laid out like a DataFrame.itertuples() row
+signal = namedtuple('signal', ['Index', 'Test', 'Connector', 'Loopback', 'Signal_Pair', 'Standard', 'Info'])
+
+_lock = threading.Lock()
+_shared = {}
+
+
+def shared_signal_map(filePath="BER_TVS_pm.txt"):
+	# The pin map is parsed once per process and shared by everyone who asks for it
+	key = os.path.abspath(filePath)
+	with _lock:
+		if key not in _shared:
+			_shared[key] = signal_map(filePath)
+		return _shared[key]
+
+
+class compiled_pin_map():
+	# The pin map as parallel columns in file order plus the lookups built from them
+	__slots__ = ('test', 'connector', 'loopback', 'signal_pair', 'standard', 'info',
+				 'driver', 'driver_pins', 'receiver', 'receiver_pins', 'loop_pins',
+				 'connectors', 'connector_rows', 'chip_rows', 'test_rows')
+
+	def __init__(self, lines):
+		# lines are the split rows below the header
+		self.test        = np.array([int(x[0]) for x in lines], dtype=int)
+		self.connector   = [x[1] for x in lines]
+		self.loopback    = [x[2] for x in lines]
+		self.signal_pair = [x[3] for x in lines]
+		self.standard    = [x[4] for x in lines]
+
+		# Info is (driver|driver pins|receiver|receiver pins|loopback pins...),
+		# differential pairs list the p and n loopback, single ended signals one
+		self.info = [x[5][1:-1].split('|') for x in lines]
+		self.driver        = [x[0] for x in self.info]
+		self.driver_pins   = [x[1] for x in self.info]
+		self.receiver      = [x[2] for x in self.info]
+		self.receiver_pins = [x[3] for x in self.info]
+		self.loop_pins     = [x[4:] for x in self.info]
+
+		self.connectors = sorted(set(self.connector), key=lambda x: int(x.replace("J", "")))
+		self.connector_rows = {c: np.array([row for row, x in enumerate(self.connector) if x == c], dtype=int) for c in self.connectors}
+
+		# a chip drives or receives, either way its rows are listed once in order
+		chips = {}
+		for row, (driver, receiver) in enumerate(zip(self.driver, self.receiver)):
+			chips.setdefault(driver, []).append(row)
+			if receiver != driver:
+				chips.setdefault(receiver, []).append(row)
+		self.chip_rows = {chip: np.array(rows, dtype=int) for chip, rows in chips.items()}
+		self.test_rows = {int(test): row for row, test in enumerate(self.test)}
+
+
+	def __len__(self):
+		return len(self.test)
+
+
+	@staticmethod
+	def parse(file):
+		# Reads the whitespace separated table, the 4th non blank line is the header
+		with open(file, 'rb') as f:
+			data = f.read()
+		return compiled_pin_map(compiled_pin_map.split(data))
+
+
+	@staticmethod
+	def split(data):
+		lines = [line.split() for line in data.decode().splitlines() if line.strip()]
+		return lines[4:]
+
 
 class signal_map():
 	def __init__(self, filePath="BER_TVS_pm.txt"):
-		self.map = self.load_signal_map(filePath)
-		
+		self.file = filePath
+		self.compiled = compiled_pin_map.parse(filePath)
+		self.records = self.load_signal_map()
+		self._map = None
+
+		# driver/receiver chip per row, for joining failsafe violations
+		self.failsafe_map = np.array(list(zip(self.compiled.driver, self.compiled.receiver)), dtype=object).reshape(-1, 2)
+		self._signals = [len(self.compiled.connector_rows[c]) for c in self.compiled.connectors]
+
+
+	def load_signal_map(self):
+		# Rows for code that walks the pin map record by record
+		c = self.compiled
+		return [signal(index, int(c.test[index]), c.connector[index], c.loopback[index], c.signal_pair[index], c.standard[index], c.info[index])
+				for index in range(len(c))]
+
+
+	@property
+	def map(self):
+		# The pin map as a DataFrame, pandas is only loaded if this is used
+		if self._map is None:
+			import pandas as pd
+			self._map = pd.DataFrame([x[1:] for x in self.records], columns=signal._fields[1:])
+		return self._map
+
+
+	def column(self, name):
+		return [getattr(x, name) for x in self.records]
 
-	def load_signal_map(self, file="BER_TVS_pm.txt"):
-		# Opens a csv file and creates a dataframe
-		pm = pd.read_csv(file, header=[3], delim_whitespace=True)
-		pm = pm.infer_objects()
-		pm['Info'] = pm['Info'].apply(lambda x: x[1:-1].split('|'))
-		return pm
-	
 
 	def signals_per_connector(self, pin_map):
-		# This method returns the total number of signals on each connector
-		conn_list = self.get_connector_list()
-		num_signals = []
-		for item in conn_list:
-			num_signals.append(len(pin_map[pin_map['Connector'] == item]))
-		return num_signals
-	
+		# This method returns the total number of signals on each connector,
+		# pin_map is a list of rows or a DataFrame
+		connectors = pin_map['Connector'] if hasattr(pin_map, 'columns') else [x.Connector for x in pin_map]
+		counts = dict.fromkeys(self.compiled.connectors, 0)
+		for connector in connectors:
+			counts[connector] += 1
+		return list(counts.values())
+
 
 	def get_signals_per_connector(self):
-		return self.signals_per_connector(self.map)
+		return list(self._signals)
 
 
 	def get_connector_list(self):
 		# This method returns a sorted list of all connectors in the pin map
-		connectorList = list(set(self.map['Connector']))
-		connectorList.sort(key=lambda x: int(x.replace("J", "")))
-		return connectorList
-	
+		return list(self.compiled.connectors)
+
+
+	def get_connector_rows(self, connector):
+		# Rows of the pin map on one connector, in file order
+		return self.compiled.connector_rows[connector]
+
+
+	def get_chip_rows(self, chip):
+		# Rows of the pin map driven or received by one chip
+		return self.compiled.chip_rows.get(chip, np.zeros(0, dtype=int))
+
 
 	def get_debug_info(self, signal):
 		# This method returns the debug info associated with each signal
-		info = self.map['Info'].iloc[signal]
+		info = self.compiled.info[signal]
 		return info
 
 
+	def get_failsafe_info(self, signals):
+		# This method returns the driver and receiver of every signal in a list of test indexes,
+		# a signal without a pin map row is listed as ['signal N', '?'] so it is never lost
+		test_rows = self.compiled.test_rows
+		failsafe_map = self.failsafe_map.tolist()
+		return [failsafe_map[test_rows[s]] if s in test_rows else [f"signal {s}", "?"]
+				for s in np.asarray(signals, dtype=int).tolist()]
+
+
 if __name__ == "__main__":
 	sm = signal_map()
 	print(sm.map)
@@ -54,3 +164,5 @@ if __name__ == "__main__":
 	print(sm.get_connector_list())
 	print(sm.get_debug_info(5))
 	print(sm.get_signals_per_connector())
+	print(sm.get_failsafe_info([5, 70]))
+	print(sm.get_chip_rows('U600'))
@@ -0,0 +1,418 @@
+###############################################
+#			Simulated XEM7310 Backend		  #
+###############################################
+# References: 	ok.py, bertvs.py			  #
+# Ingenion, LLC								  #
+###############################################
+
+# In-process stand in for the parts of the Opal Kelly 'ok' module that
+# FP_API uses. Pass the module itself as the backend:
+#
+#	fp = FP_API(backend=sim_xem)
+#
+# Boards are attached and removed the same way the FrontPanel test hook
+# does it, through FrontPanelEmulateTestDeviceConnection(serial, connect).
+
+import os
+import time
+import queue
+import threading
+
+# BER TVS design version reported at 0x0000
+DESIGN_VERSION = 0x0004
+
+# Register entries in the default TVS layout, diff A / diff B / diff C / single
+DEFAULT_LAYOUT = (40, 4, 12, 20)
+
+# Delay counts that land each group in the right delay_to_type bucket
+# (RS422 >= 30 ns, LVDS < 30 ns, TTL >= 100 ns)
+DEFAULT_DELAYS = (6, 6, 2, 1)
+
+_lock = threading.Lock()
+_boards = {}
+_managers = []
+
+
+class okTRegisterEntry():
+	__slots__ = ('address', 'data')
+
+	def __init__(self, address=0, data=0):
+		self.address = address
+		self.data = data
+
+
+class okTRegisterEntries(list):
+	def __init__(self, n=0):
+		super().__init__(okTRegisterEntry() for _ in range(n))
+
+
+class okTDeviceInfo():
+	def __init__(self):
+		self.productName = ""
+		self.deviceMajorVersion = 0
+		self.deviceMinorVersion = 0
+		self.serialNumber = ""
+		self.deviceID = ""
+
+
+class SimBoard():
+	def __init__(self, serial, layout=DEFAULT_LAYOUT, delays=DEFAULT_DELAYS,
+				 version=DESIGN_VERSION, link_time=0.0, latency=0.0, register_latency=0.0,
+				 configure_time=0.0):
+		self.serial = serial
+		self.version = version
+		self.layout = tuple(layout)
+		self.size = sum(self.layout)
+
+		# per-call latency in seconds, plus a per-register cost for ReadRegisters
+		self.latency = latency
+		self.register_latency = register_latency
+		# time a full bitstream download takes
+		self.configure_time = configure_time
+		self.downloads = 0
+
+		# seconds after the reset is released before a channel reports connected
+		self.link_time = [link_time] * self.size
+
+		self.delays = []
+		for count, delay in zip(self.layout, delays):
+			self.delays += [delay] * count
+		self.errors = [0] * self.size
+		self.dropped = set()
+		self.failsafe_faults = set()
+
+		self.opened = False
+		self.configured = False
+		self.in_reset = False
+		self.released = time.monotonic()
+		self.wire_ins = {}
+		self._pending = {}
+		self._lock = threading.Lock()
+
+	def offsets_word(self):
+		a, b, c, s = self.layout
+		return (a & 0x3f) | (b & 0x3f) << 6 | (c & 0x3f) << 12 | (s & 0x3f) << 18
+
+	def inject(self, channel, errors=None, connected=None, delay=None):
+		# Overrides the simulated state of a single BER channel
+		if errors is not None:
+			self.errors[channel] = errors & 0x03ff_ffff
+		if delay is not None:
+			self.delays[channel] = delay & 0x1f
+		if connected is not None:
+			if connected:
+				self.dropped.discard(channel)
+			else:
+				self.dropped.add(channel)
+
+	def ber_word(self, channel, now):
+		if self.in_reset:
+			return 0
+		if channel in self.dropped or now - self.released < self.link_time[channel]:
+			return 0
+		return (1 << 31) | (self.delays[channel] << 26) | self.errors[channel]
+
+	def failsafe_word(self, reg):
+		word = 0xffff_ffff
+		for signal in self.failsafe_faults:
+			if signal // 32 == reg:
+				word &= ~(1 << (signal % 32))
+		return word
+
+	def read(self, address, now):
+		if not self.configured:
+			return 0
+		if address == 0x0000:
+			return self.version
+		if address == 0x0001:
+			return self.offsets_word()
+		if 4 <= address < 8:
+			return self.failsafe_word(address - 4)
+		if 8 <= address < 8 + self.size:
+			return self.ber_word(address - 8, now)
+		return 0
+
+	def set_wire_in(self, ep, value, mask):
+		self._pending[ep] = (self._pending.get(ep, self.wire_ins.get(ep, 0)) & ~mask) | (value & mask)
+
+	def update_wire_ins(self):
+		self.wire_ins.update(self._pending)
+		self._pending.clear()
+		# wire 0 bit 0 low holds the BER logic in reset, the rising edge restarts it
+		running = bool(self.wire_ins.get(0, 1) & 1)
+		if self.in_reset and running:
+			self.released = time.monotonic()
+		self.in_reset = not running
+
+	def stall(self, registers=0):
+		delay = self.latency + registers * self.register_latency
+		if delay > 0:
+			time.sleep(delay)
+
+
+def attach(serial="SIM7310-0001", **config):
+	# Attaches a simulated board and returns it so a test can drive its state
+	board = SimBoard(serial, **config)
+	with _lock:
+		_boards[serial] = board
+	_notify(True, serial)
+	return board
+
+
+def detach(serial):
+	with _lock:
+		board = _boards.pop(serial, None)
+	if board is not None:
+		board.opened = False
+		_notify(False, serial)
+	return board
+
+
+def _notify(added, serial):
+	# Delivers a hot plug event to every monitoring FrontPanelManager
+	for manager in list(_managers):
+		manager._events.put((added, serial))
+
+
+def get_board(serial):
+	return _boards.get(serial)
+
+
+def FrontPanelEmulateTestDeviceConnection(serial, connect):
+	# Same hook name as the FrontPanel API, attaches or removes a board
+	if connect:
+		if serial not in _boards:
+			attach(serial)
+	else:
+		detach(serial)
+	return okCFrontPanel.NoError
+
+
+class okCFrontPanel():
+	NoError = 0
+	Failed = -1
+	Timeout = -2
+	DoneNotHigh = -3
+	TransferError = -4
+	CommunicationError = -5
+	InvalidBitstream = -6
+	FileError = -7
+	DeviceNotOpen = -8
+	InvalidEndpoint = -9
+	UnsupportedFeature = -15
+
+	def __init__(self):
+		self.board = None
+
+	def _ready(self):
+		# The board can be unplugged underneath an open handle
+		board = self.board
+		if board is None or _boards.get(board.serial) is not board:
+			self.board = None
+			return None
+		return board
+
+	def GetDeviceCount(self):
+		return len(_boards)
+
+	def GetDeviceListSerial(self, num):
+		serials = list(_boards)
+		return serials[num] if num < len(serials) else ""
+
+	def OpenBySerial(self, serial=""):
+		with _lock:
+			for board in _boards.values():
+				if (serial == "" and not board.opened) or board.serial == serial:
+					if board.opened:
+						break
+					board.opened = True
+					self.board = board
+					board.stall()
+					return self.NoError
+		return self.DeviceNotOpen
+
+	def IsOpen(self):
+		return self._ready() is not None
+
+	def Close(self):
+		if self.board is not None:
+			self.board.opened = False
+		self.board = None
+
+	def ConfigureFPGA(self, strFilename):
+		board = self._ready()
+		if board is None:
+			return self.DeviceNotOpen
+		if not os.path.exists(strFilename):
+			return self.FileError
+		return self._download(board)
+
+	def ConfigureFPGAFromMemory(self, data):
+		board = self._ready()
+		if board is None:
+			return self.DeviceNotOpen
+		if len(data) == 0:
+			return self.InvalidBitstream
+		return self._download(board)
+
+	def _download(self, board):
+		board.stall()
+		if board.configure_time > 0:
+			time.sleep(board.configure_time)
+		board.downloads += 1
+		board.configured = True
+		board.in_reset = False
+		board.released = time.monotonic()
+		return self.NoError
+
+	def ResetFPGA(self):
+		board = self._ready()
+		if board is None:
+			return self.DeviceNotOpen
+		board.stall()
+		board.released = time.monotonic()
+		return self.NoError
+
+	def GetDeviceInfo(self, info):
+		board = self._ready()
+		if board is None:
+			return self.DeviceNotOpen
+		info.productName = "XEM7310-A200"
+		info.deviceMajorVersion = 1
+		info.deviceMinorVersion = 0
+		info.serialNumber = board.serial
+		info.deviceID = "BER TVS (simulated)"
+		return self.NoError
+
+	def LoadDefaultPLLConfiguration(self):
+		return self.NoError if self._ready() is not None else self.DeviceNotOpen
+
+	def IsFrontPanelEnabled(self):
+		board = self._ready()
+		return board is not None and board.configured
+
+	def ReadRegister(self, addr):
+		board = self._ready()
+		if board is None:
+			return 0
+		board.stall(1)
+		return board.read(addr, time.monotonic())
+
+	def ReadRegisters(self, regs):
+		board = self._ready()
+		if board is None:
+			return self.DeviceNotOpen
+		board.stall(len(regs))
+		now = time.monotonic()
+		with board._lock:
+			for reg in regs:
+				reg.data = board.read(reg.address, now)
+		return self.NoError
+
+	def SetWireInValue(self, ep, val, mask=0xffff_ffff):
+		board = self._ready()
+		if board is None:
+			return self.DeviceNotOpen
+		board.set_wire_in(ep, val, mask)
+		return self.NoError
+
+	def UpdateWireIns(self):
+		board = self._ready()
+		if board is None:
+			return
+		board.stall()
+		with board._lock:
+			board.update_wire_ins()
+
+
+class okCFrontPanelDevices():
+	# Snapshot of the attached boards, like the FrontPanel device enumerator
+	def __init__(self, realm=""):
+		self._serials = list(_boards)
+
+	def GetCount(self):
+		return len(self._serials)
+
+	def GetSerial(self, num):
+		return self._serials[num] if num < len(self._serials) else ""
+
+	def Open(self, serial=""):
+		dev = okCFrontPanel()
+		if dev.OpenBySerial(serial) != dev.NoError:
+			return None
+		return dev
+
+
+class FrontPanelManager():
+	# Subclass and override OnDeviceAdded/OnDeviceRemoved, the callbacks run
+	# on the thread that sits in EnterMonitorLoop
+	def __init__(self, realm=""):
+		self._events = queue.Queue()
+		self._exit_code = 0
+
+	def StartMonitoring(self, cbInfo=None):
+		with _lock:
+			if self in _managers:
+				return
+			_managers.append(self)
+			# boards already present are reported as added
+			for serial in _boards:
+				self._events.put((True, serial))
+
+	def StopMonitoring(self):
+		with _lock:
+			if self in _managers:
+				_managers.remove(self)
+
+	def EnterMonitorLoop(self, cbInfo=None, millisecondsTimeout=0):
+		self.StartMonitoring(cbInfo)
+		deadline = time.monotonic() + millisecondsTimeout/1000 if millisecondsTimeout else None
+		while True:
+			timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+			try:
+				event = self._events.get(timeout=timeout)
+			except queue.Empty:
+				return 0
+			if event is None:
+				return self._exit_code
+			added, serial = event
+			if added:
+				self.OnDeviceAdded(serial)
+			else:
+				self.OnDeviceRemoved(serial)
+
+	def ExitMonitorLoop(self, exitCode=0):
+		self._exit_code = exitCode
+		self._events.put(None)
+
+	def OnDeviceAdded(self, serial):
+		pass
+
+	def OnDeviceRemoved(self, serial):
+		pass
+
+	def Open(self, serial):
+		dev = okCFrontPanel()
+		if dev.OpenBySerial(serial) != dev.NoError:
+			return None
+		return dev
+
+
+# One board is present by default so FP_API(backend=sim_xem) connects straight away
+attach()
+
+
+if __name__ == "__main__":
+	import sim_xem
+	from bertvs import FP_API
+
+	fp = FP_API(backend=sim_xem)
+	fp.print_offsets()
+	print(f'Failsafe violations: {fp.failsafe_status()}')
+
+	polls = 5000
+	start = time.perf_counter()
+	for _ in range(polls):
+		fp.read_test_registers()
+	elapsed = time.perf_counter() - start
+	print(f'{polls} polls in {elapsed:.3f} s, {polls/elapsed:.0f} polls/s')
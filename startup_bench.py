@@ -0,0 +1,112 @@
+###############################################
+#				Startup Benchmark			  #
+###############################################
+# References: 	bertvs_gui.py, bertvs_cli.py  #
+# Ingenion, LLC								  #
+###############################################
+
+# Starts fresh interpreters and reports, from process launch:
+#	headless	time until the pin map, verdict engine and device are ready and the first poll is done
+#	gui			time until the main window is drawn and until the first poll
+#
+#	python3 startup_bench.py [--runs 5] [--hardware]
+#
+# The simulated XEM7310 is used unless --hardware is given.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def child(mode, t0, hardware):
+	marks = {}
+	backend = None
+	if not hardware:
+		import sim_xem
+		backend = sim_xem
+
+	if mode == 'headless':
+		from bertvs import FP_API
+		from signal_map import shared_signal_map
+		from ber_verdict import verdict_engine
+		from log_manager import log_manager
+		marks['imports'] = time.time() - t0
+
+		engine = verdict_engine(shared_signal_map())
+		device = FP_API(backend)
+		marks['connected'] = time.time() - t0
+
+		device.read_test_registers()
+		engine.evaluate(device.ber_test)
+		marks['first_poll'] = time.time() - t0
+
+	else:
+		from bertvs_gui import GUI
+		marks['imports'] = time.time() - t0
+
+		app = GUI(backend)
+		app.window.update()
+		marks['window'] = time.time() - t0
+
+		# the TVS connects in the background, keep Tk running until it is there
+		deadline = time.monotonic() + 10
+		while not app.device.connected and time.monotonic() < deadline:
+			app.window.update()
+			time.sleep(0.001)
+		app.device.read_test_registers()
+		app.read_progress(app.device.ber_test.copy())
+		app.window.update()
+		marks['first_poll'] = time.time() - t0
+		app.monitor.stop()
+		app.window.destroy()
+
+	marks['pandas_loaded']  = 'pandas' in sys.modules
+	marks['tkinter_loaded'] = 'tkinter' in sys.modules
+	print(json.dumps(marks))
+
+
+def measure(mode, runs, hardware):
+	# Median of each mark over runs fresh processes, None if the mode can not run here
+	results = []
+	for _ in range(runs):
+		command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--t0', repr(time.time())]
+		if hardware:
+			command.append('--hardware')
+		done = subprocess.run(command, cwd=HERE, capture_output=True, text=True)
+		if done.returncode != 0:
+			return None, done.stderr.strip().splitlines()[-1:]
+		results.append(json.loads(done.stdout.strip().splitlines()[-1]))
+
+	summary = {}
+	for key in results[0]:
+		values = [r[key] for r in results]
+		summary[key] = statistics.median(values) if isinstance(values[0], float) else values[0]
+	return summary, None
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Measures time to window and time to first poll.")
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('--hardware', action='store_true', help="use the FrontPanel API instead of sim_xem")
+	parser.add_argument('--child', choices=['headless', 'gui'], help=argparse.SUPPRESS)
+	parser.add_argument('--t0', type=float, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.child:
+		child(args.child, args.t0, args.hardware)
+		sys.exit(0)
+
+	for mode in ('headless', 'gui'):
+		summary, error = measure(mode, args.runs, args.hardware)
+		print(f'{mode}:')
+		if summary is None:
+			print(f'   skipped: {error}')
+			continue
+		for key, value in summary.items():
+			print(f'   {key:<16}{value*1000:8.1f} ms' if isinstance(value, float) else f'   {key:<16}{value}')
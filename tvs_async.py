@@ -0,0 +1,113 @@
+###############################################
+#				TVS Asyncio API				  #
+###############################################
+# References: 	bertvs.py, tvs_fleet.py		  #
+# Ingenion, LLC								  #
+###############################################
+
+# Awaitable FP_API for asyncio applications. Every device call of a board runs on
+# that board's device owner thread, so its USB traffic stays in order while the
+# event loop is free to drive other boards and I/O.
+
+import asyncio
+
+from bertvs import FP_API, PRIORITY_CONTROL, PRIORITY_QUERY, PRIORITY_POLL
+
+
+class TVS_Async():
+	def __init__(self, backend=None, serial=""):
+		# Nothing touches the hardware until connect is awaited
+		self.device = FP_API(backend, serial, connect=False)
+
+
+	async def _call(self, function, *args, priority=PRIORITY_QUERY):
+		return await asyncio.wrap_future(self.device.submit(function, *args, priority=priority))
+
+
+	@property
+	def connected(self):
+		return bool(self.device.connected)
+
+
+	async def connect(self, attempts=5):
+		# Connects, configures and resets the board, returns whether it is connected
+		def connect():
+			self.device.connect_TVS(attempts)
+			self.device.device_reset()
+			return bool(self.device.connected)
+		return await self._call(connect, priority=PRIORITY_CONTROL)
+
+
+	async def disconnect(self):
+		await self._call(self.device.disconnect_TVS, priority=PRIORITY_CONTROL)
+
+
+	async def reset(self):
+		await self._call(self.device.reset_ber_test, priority=PRIORITY_CONTROL)
+
+
+	async def failsafe_status(self):
+		return await self._call(self.device.failsafe_status)
+
+
+	async def read_snapshot(self):
+		# Polls the BER block, returns a copy of ber_test that later polls do not change
+		def read():
+			self.device.read_test_registers()
+			return self.device.ber_test.copy()
+		return await self._call(read, priority=PRIORITY_POLL)
+
+
+	async def snapshots(self, interval=0.1, count=None):
+		# Yields a snapshot every interval seconds, count limits how many
+		loop = asyncio.get_running_loop()
+		next_poll = loop.time()
+		taken = 0
+		while count is None or taken < count:
+			if not self.connected:
+				return
+			yield await self.read_snapshot()
+			taken += 1
+			# keeps the pace when a poll runs long instead of drifting
+			next_poll = max(next_poll + interval, loop.time())
+			await asyncio.sleep(next_poll - loop.time())
+
+
+	async def close(self):
+		await asyncio.get_running_loop().run_in_executor(None, self.device.close)
+
+
+	async def __aenter__(self):
+		return self
+
+
+	async def __aexit__(self, *exc):
+		await self.close()
+
+
+if __name__ == "__main__":
+	import time
+	import sim_xem
+
+	async def main():
+		serials = [f"SIM7310-{i:04d}" for i in range(2, 6)]
+		for serial in serials:
+			sim_xem.attach(serial)
+		boards = [TVS_Async(sim_xem, serial) for serial in serials]
+
+		print(await asyncio.gather(*(board.connect(1) for board in boards)))
+		print(await asyncio.gather(*(board.failsafe_status() for board in boards)))
+
+		async def run(board):
+			polls = 0
+			async for test in board.snapshots(interval=0.01, count=100):
+				polls += 1
+			return polls
+
+		start = time.perf_counter()
+		polls = sum(await asyncio.gather(*(run(board) for board in boards)))
+		print(f'{polls/(time.perf_counter() - start):.0f} board polls/s at 100 Hz per board')
+
+		await asyncio.gather(*(board.close() for board in boards))
+
+	asyncio.run(main())
@@ -0,0 +1,116 @@
+###############################################
+#				TVS Fleet Control			  #
+###############################################
+# References: 	bertvs.py					  #
+# Ingenion, LLC								  #
+###############################################
+
+import time
+
+from bertvs import FP_API, frontpanel, PRIORITY_CONTROL, PRIORITY_QUERY, PRIORITY_POLL
+from signal_map import shared_signal_map
+from ber_verdict import verdict_engine
+
+
+class TVS_Fleet():
+	def __init__(self, backend=None, serials=None):
+		# Drives every attached TVS from one process, each board keeps its own FP_API
+		self._ok = backend if backend is not None else frontpanel()
+		if serials is None:
+			serials = self.enumerate()
+
+		self.boards = {}
+		# the same pass rule as the GUI, CLI and log
+		self.engine = verdict_engine(shared_signal_map())
+
+		# Every FP_API runs its USB traffic in order on its own owner thread, so the
+		# boards run in parallel and all of them are programmed at the same time
+		for serial in serials:
+			self.boards[serial] = FP_API(self._ok, serial, connect=False)
+		opening = [board.submit(self._open, board, priority=PRIORITY_CONTROL) for board in self.boards.values()]
+		for future in opening:
+			future.result()
+
+
+	@staticmethod
+	def _open(board):
+		board.connect_TVS(5)
+		board.device_reset()
+
+
+	def enumerate(self):
+		# Returns the serial number of every attached device
+		devices = self._ok.okCFrontPanelDevices()
+		return [devices.GetSerial(i) for i in range(devices.GetCount())]
+
+
+	@property
+	def serials(self):
+		return list(self.boards)
+
+
+	def connected(self):
+		return [serial for serial, board in self.boards.items() if board.connected]
+
+
+	def _run(self, action, priority=PRIORITY_POLL):
+		# Runs action(board) on every connected board's owner thread at once and
+		# collects the results, an exception only fails its own board
+		pending = {}
+		for serial, board in self.boards.items():
+			if board.connected:
+				pending[serial] = board.submit(action, board, priority=priority)
+
+		results = {}
+		for serial in self.boards:
+			if serial not in pending:
+				results[serial] = {'error': 'TVS is not connected'}
+				continue
+			try:
+				results[serial] = pending[serial].result()
+			except Exception as e:
+				results[serial] = {'error': str(e)}
+		return results
+
+
+	def _poll(self, board):
+		board.read_test_registers()
+		test = board.ber_test.copy()
+		return {'ber_test': test, 'passed': self.engine.evaluate(test).pass_fail, 'error': None}
+
+
+	def poll(self):
+		# Reads the BER block of every board, returns {serial: {'ber_test', 'passed', 'error'}},
+		# passed is the ber_verdict pass_fail of the snapshot
+		return self._run(self._poll)
+
+
+	def failsafe_status(self):
+		return self._run(lambda board: {'violations': board.failsafe_status(), 'error': None}, PRIORITY_QUERY)
+
+
+	def reset(self):
+		return self._run(lambda board: {'error': board.reset_ber_test()}, PRIORITY_CONTROL)
+
+
+	def close(self):
+		# every board has an owner thread, connected or not
+		for board in self.boards.values():
+			board.close()
+
+
+if __name__ == "__main__":
+	fleet = TVS_Fleet()
+	print(f'Boards: {fleet.serials}')
+	print(f'Connected: {fleet.connected()}\n')
+
+	polls = 100
+	start = time.perf_counter()
+	for _ in range(polls):
+		results = fleet.poll()
+	elapsed = time.perf_counter() - start
+
+	for serial, result in results.items():
+		print(f"{serial}: {'passed' if result.get('passed') else 'failed'} {result['error'] or ''}")
+	print(f'\n{polls*len(fleet.connected())/elapsed:.0f} board polls/s')
+	fleet.close()
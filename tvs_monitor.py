@@ -0,0 +1,102 @@
+###############################################
+#				TVS Hot Plug Monitor		  #
+###############################################
+# References: 	bertvs.py, ok.py			  #
+# Ingenion, LLC								  #
+###############################################
+
+import queue
+import threading
+
+
+def _manager_class(backend):
+	# FrontPanelManager is a SWIG director class, the callbacks are overridden in Python
+	class _Manager(backend.FrontPanelManager):
+		def __init__(self, monitor):
+			super().__init__()
+			self.monitor = monitor
+
+		def OnDeviceAdded(self, serial):
+			self.monitor.device_added(serial)
+
+		def OnDeviceRemoved(self, serial):
+			self.monitor.device_removed(serial)
+
+	return _Manager
+
+
+class TVS_Monitor():
+	def __init__(self, device, backend=None):
+		# Watches for boards being plugged in or pulled out and keeps device in step.
+		# Events are ('connected', serial), ('disconnected', serial) or ('failed', '')
+		# and are queued for the GUI to pick up from its own thread.
+		self.device = device
+		self._ok = backend if backend is not None else device._ok
+		self.events = queue.Queue()
+		# hot plug and the Connect button must not connect the board twice
+		self._connecting = threading.Lock()
+
+		self._manager = _manager_class(self._ok)(self)
+		self._thread = threading.Thread(target=self._manager.EnterMonitorLoop, daemon=True)
+		self._thread.start()
+
+
+	def device_added(self, serial):
+		# Runs on the monitor thread, a new board is configured here and not on the UI thread
+		with self._connecting:
+			if self.device.device_added(serial):
+				self.events.put(('connected', serial))
+
+
+	def device_removed(self, serial):
+		if self.device.device_removed(serial):
+			self.events.put(('disconnected', serial))
+
+
+	def connect(self):
+		# Connects in the background, the outcome arrives as an event
+		def attempt():
+			with self._connecting:
+				if self.device.connected:
+					return
+				self.device.connect_TVS(0)
+				if self.device.connected:
+					self.device.device_reset()
+					self.events.put(('connected', self.device.serialNumber))
+				else:
+					self.events.put(('failed', ''))
+
+		threading.Thread(target=attempt, daemon=True).start()
+
+
+	def get_events(self):
+		# Returns every event queued since the last call without blocking
+		events = []
+		while True:
+			try:
+				events.append(self.events.get_nowait())
+			except queue.Empty:
+				return events
+
+
+	def stop(self):
+		self._manager.ExitMonitorLoop()
+		self._manager.StopMonitoring()
+		self._thread.join(1)
+
+
+if __name__ == "__main__":
+	import time
+	import sim_xem
+	from bertvs import FP_API
+
+	fp = FP_API(backend=sim_xem, attempts=0)
+	monitor = TVS_Monitor(fp)
+
+	sim_xem.FrontPanelEmulateTestDeviceConnection("SIM7310-0001", False)
+	time.sleep(0.2)
+	sim_xem.FrontPanelEmulateTestDeviceConnection("SIM7310-0001", True)
+	time.sleep(0.5)
+
+	print(monitor.get_events())
+	monitor.stop()